@@ -1,17 +1,18 @@
 import json
+import time
 import requests
 
-def main():
-    # Read HTML file
-    try:
-        with open("detail_page.html", "r", encoding="utf-8") as file:
-            html_content = file.read()
-    except FileNotFoundError:
-        print("❌ Error: 'movie_page.html' file not found in the current directory.")
-        return
+from html_reducer import chunk_regions, estimate_tokens, reduce_html
 
-    # Build prompt for the AI model
-    prompt = f"""
+OLLAMA_URL = "http://localhost:11434/api/generate"
+MODEL = "mistral"
+# Per-chunk token budget; leaves room for the instructions and the answer in Mistral's context
+CHUNK_TOKENS = 1500
+
+# Bump whenever PROMPT_TEMPLATE changes so cached extractions are not reused
+PROMPT_VERSION = "1"
+
+PROMPT_TEMPLATE = """
 You are an expert in extracting structured data from messy HTML.
 
 Your task: From the following HTML, extract where the movie is available to stream, rent, or purchase.
@@ -30,41 +31,88 @@ Return the data in the following JSON structure ONLY:
 Here is the HTML content:
 
 <html> {html_content} </html> """
-    
 
-    # Send request to local Ollama server running Mistral
+
+def build_prompt(html_content):
+    return PROMPT_TEMPLATE.format(html_content=html_content)
+
+
+def merge_results(results):
+    """Combine the per-chunk answers into one, dropping duplicate offers."""
+    merged, seen = [], set()
+    for result in results:
+        # Models happily answer "stream": null or "platform": null; treat those as missing
+        offers = result.get("stream") if isinstance(result, dict) else None
+        for offer in offers if isinstance(offers, list) else []:
+            if not isinstance(offer, dict):
+                continue
+            key = (str(offer.get("platform") or "").lower(), str(offer.get("url") or ""))
+            if key not in seen:
+                seen.add(key)
+                merged.append(offer)
+    return {"stream": merged}
+
+
+def main():
+    # Read HTML file
     try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": "mistral",
-                "prompt": prompt,
-                "stream": False,
-                "max_tokens": 1024,
-                "temperature": 0
-            },
-            timeout=600
-        )
-        response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"❌ Error communicating with Ollama API: {e}")
+        with open("detail_page.html", "r", encoding="utf-8") as file:
+            html_content = file.read()
+    except FileNotFoundError:
+        print("❌ Error: 'detail_page.html' file not found in the current directory.")
         return
 
-    # Parse and print the response
-    try:
-        result = response.json()
-        # The extracted text is in result["response"]
-        extracted_json_str = result.get("response", "").strip()
-
-        # Try to parse JSON from the response string
-        extracted_json = json.loads(extracted_json_str)
-        print("\n📦 Extracted JSON Output:\n")
-        print(json.dumps(extracted_json, indent=2))
-    except (json.JSONDecodeError, TypeError):
-        print("\n⚠️ Warning: Could not parse JSON from model output. Here's raw response:")
-        print(extracted_json_str)
-    except Exception as e:
-        print(f"❌ Unexpected error: {e}")
+    # Cut the page down to its offer regions before it goes anywhere near the model
+    started = time.perf_counter()
+    chunks = chunk_regions(reduce_html(html_content), CHUNK_TOKENS)
+    reduce_ms = (time.perf_counter() - started) * 1000
+    full_tokens = estimate_tokens(build_prompt(html_content))
+    reduced_tokens = sum(estimate_tokens(build_prompt(chunk)) for chunk in chunks)
+    print(f"📉 Prompt size: ~{full_tokens:,} tokens -> ~{reduced_tokens:,} tokens "
+          f"in {len(chunks)} chunk(s) (reduced in {reduce_ms:.0f} ms)")
+    if not chunks:
+        print("⚠️ Warning: No offer regions found in the page.")
+        return
+
+    results = []
+    for i, chunk in enumerate(chunks, 1):
+        # Send request to local Ollama server running Mistral
+        started = time.perf_counter()
+        try:
+            response = requests.post(
+                OLLAMA_URL,
+                json={
+                    "model": MODEL,
+                    "prompt": build_prompt(chunk),
+                    "stream": False,
+                    "max_tokens": 1024,
+                    "temperature": 0
+                },
+                timeout=120
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"❌ Error communicating with Ollama API: {e}")
+            return
+        print(f"⏱️ Chunk {i}/{len(chunks)} answered in {time.perf_counter() - started:.1f}s")
+
+        # Parse the response
+        extracted_json_str = ""
+        try:
+            result = response.json()
+            # The extracted text is in result["response"]
+            extracted_json_str = result.get("response", "").strip()
+
+            # Try to parse JSON from the response string
+            results.append(json.loads(extracted_json_str))
+        except (json.JSONDecodeError, TypeError):
+            print(f"\n⚠️ Warning: Could not parse JSON from chunk {i}. Here's raw response:")
+            print(extracted_json_str)
+        except Exception as e:
+            print(f"❌ Unexpected error: {e}")
+
+    print("\n📦 Extracted JSON Output:\n")
+    print(json.dumps(merge_results(results), indent=2))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""Pub/sub backplane that lets several chat_server processes share one room.
+
+Every node publishes the messages its own clients produce and receives the
+messages published by the other nodes, which it then fans out only to its
+local members. Messages carry a unique ID so a node never delivers the same
+message twice, even if the transport echoes it back.
+
+Two transports are available:
+
+* ``unix:/path/to.sock`` - a tiny relay hub over a Unix domain socket, started
+  with ``python chat_backplane.py --hub /path/to.sock``. Good for running
+  several nodes on one machine and for local testing.
+* ``redis://host:port/db`` - Redis pub/sub (needs the ``redis`` package), for
+  nodes spread across machines.
+"""
+import argparse
+import json
+import logging
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+DEFAULT_CHANNEL = "chat"
+# Bytes the hub queues for one slow node before dropping it
+HUB_MAX_PENDING = 8 * 1024 * 1024
+
+
+def new_message_id(node_id):
+    """Return a globally unique message ID prefixed with the originating node."""
+    return f"{node_id}:{uuid.uuid4().hex}"
+
+
+class MessageDeduper:
+    """Remembers the most recent message IDs so duplicates can be dropped."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def first_time(self, msg_id):
+        """Return True the first time an ID is seen, False for every repeat."""
+        with self._lock:
+            if msg_id in self._seen:
+                return False
+            self._seen[msg_id] = None
+            if len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+            return True
+
+
+class Backplane:
+    """Base class for backplane transports.
+
+    Subclasses implement ``publish`` and ``_run``; ``_run`` must call
+    ``self._dispatch(raw)`` for every envelope received from the transport.
+    """
+
+    def __init__(self, node_id, channel=DEFAULT_CHANNEL):
+        self.node_id = node_id
+        self.channel = channel
+        self.on_message = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self, on_message):
+        """Start delivering remote messages to ``on_message(msg_id, payload)``."""
+        self.on_message = on_message
+        self._thread = threading.Thread(target=self._run, name="backplane", daemon=True)
+        self._thread.start()
+
+    def publish(self, msg_id, payload):
+        raise NotImplementedError
+
+    def close(self):
+        self._stopped.set()
+
+    def _envelope(self, msg_id, payload):
+        return json.dumps({"id": msg_id, "node": self.node_id, "payload": payload})
+
+    def _dispatch(self, raw):
+        # Runs on the receive thread, which must survive anything a peer sends
+        try:
+            envelope = json.loads(raw)
+        except (ValueError, TypeError) as e:
+            logging.warning(f"Dropping malformed backplane message: {e}")
+            return
+        if not isinstance(envelope, dict) or not isinstance(envelope.get("id"), str) or not isinstance(envelope.get("payload"), str):
+            logging.warning(f"Dropping backplane message without an id and payload: {str(raw)[:200]}")
+            return
+        if envelope.get("node") == self.node_id:
+            return  # Our own message echoed back; already delivered locally
+        if self.on_message:
+            try:
+                self.on_message(envelope["id"], envelope["payload"])
+            except Exception as e:
+                logging.exception(f"Failed to deliver backplane message {envelope['id']}: {e}")
+
+    def _run(self):
+        raise NotImplementedError
+
+
+class UnixSocketBackplane(Backplane):
+    """Backplane client for the Unix-domain-socket relay hub."""
+
+    def __init__(self, path, node_id, channel=DEFAULT_CHANNEL, reconnect_delay=1.0):
+        super().__init__(node_id, channel)
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self._sock = None
+        self._send_lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        with self._send_lock:
+            self._sock = sock
+        logging.info(f"Node {self.node_id} connected to backplane hub at {self.path}")
+        return sock
+
+    def publish(self, msg_id, payload):
+        line = (self._envelope(msg_id, payload) + "\n").encode()
+        with self._send_lock:
+            if self._sock is None:
+                logging.warning(f"Backplane not connected, message {msg_id} stays local")
+                return
+            try:
+                self._sock.sendall(line)
+            except (ConnectionResetError, BrokenPipeError, OSError) as e:
+                logging.error(f"Backplane publish failed: {e}")
+                self._sock = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                sock = self._connect()
+            except OSError as e:
+                logging.warning(f"Backplane hub unavailable at {self.path}: {e}")
+                time.sleep(self.reconnect_delay)
+                continue
+            buffer = b""
+            try:
+                while not self._stopped.is_set():
+                    chunk = sock.recv(65536)
+                    if not chunk:
+                        break
+                    buffer += chunk
+                    *lines, buffer = buffer.split(b"\n")
+                    for line in lines:
+                        if line:
+                            self._dispatch(line)
+            except (ConnectionResetError, BrokenPipeError, OSError) as e:
+                logging.error(f"Backplane receive error: {e}")
+            with self._send_lock:
+                self._sock = None
+            try:
+                sock.close()
+            except OSError:
+                pass
+            if not self._stopped.is_set():
+                logging.warning("Lost connection to backplane hub, reconnecting...")
+                time.sleep(self.reconnect_delay)
+
+    def close(self):
+        super().close()
+        with self._send_lock:
+            if self._sock is not None:
+                try:
+                    self._sock.close()
+                except OSError:
+                    pass
+                self._sock = None
+
+
+class RedisBackplane(Backplane):
+    """Backplane over Redis pub/sub, for nodes on different machines."""
+
+    def __init__(self, url, node_id, channel=DEFAULT_CHANNEL):
+        super().__init__(node_id, channel)
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The redis package is required for redis:// backplanes (pip install redis)")
+        self._redis = redis.Redis.from_url(url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+
+    def publish(self, msg_id, payload):
+        try:
+            self._redis.publish(self.channel, self._envelope(msg_id, payload))
+        except Exception as e:
+            logging.error(f"Backplane publish failed: {e}")
+
+    def _run(self):
+        subscribed = False
+        while not self._stopped.is_set():
+            try:
+                if not subscribed:
+                    # Inside the retry loop so a Redis that is down at startup is waited for
+                    self._pubsub.subscribe(self.channel)
+                    subscribed = True
+                    logging.info(f"Node {self.node_id} subscribed to redis channel '{self.channel}'")
+                message = self._pubsub.get_message(timeout=1.0)
+            except Exception as e:
+                logging.error(f"Backplane receive error: {e}")
+                time.sleep(1)
+                continue
+            if message and message.get("type") == "message":
+                self._dispatch(message["data"])
+
+    def close(self):
+        super().close()
+        try:
+            self._pubsub.close()
+        except Exception:
+            pass
+
+
+def create_backplane(url, node_id, channel=DEFAULT_CHANNEL):
+    """Build a backplane from a ``unix:`` or ``redis://`` URL."""
+    if url.startswith("unix:"):
+        return UnixSocketBackplane(url[len("unix:"):], node_id, channel)
+    if url.startswith(("redis://", "rediss://", "unix+redis://")):
+        return RedisBackplane(url.replace("unix+redis://", "unix://", 1), node_id, channel)
+    raise ValueError(f"Unsupported backplane URL: {url}")
+
+
+def run_hub(path, max_pending=HUB_MAX_PENDING):
+    """Relay every line received from one node to all the other nodes.
+
+    Node sockets are non-blocking with a per-node outbound buffer, so a node
+    that stops reading only holds up itself; once more than ``max_pending``
+    bytes are queued for it, it is dropped.
+    """
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(64)
+    logging.info(f"Backplane hub listening on {path}")
+
+    buffers = {}
+    outboxes = {}
+
+    def detach(sock, reason=None):
+        if reason:
+            logging.error(f"Hub dropping a node: {reason}")
+        buffers.pop(sock, None)
+        outboxes.pop(sock, None)
+        sock.close()
+        logging.info(f"Node detached from hub ({len(buffers)} connected)")
+
+    try:
+        while True:
+            writers = [sock for sock, outbox in outboxes.items() if outbox]
+            readable, writable, _ = select.select([server] + list(buffers), writers, [], 10)
+            for sock in writable:
+                if sock not in outboxes:
+                    continue  # Dropped earlier in this round
+                try:
+                    sent = sock.send(outboxes[sock])
+                except BlockingIOError:
+                    continue
+                except OSError as e:
+                    detach(sock, e)
+                    continue
+                del outboxes[sock][:sent]
+            for sock in readable:
+                if sock is server:
+                    conn, _ = server.accept()
+                    conn.setblocking(False)
+                    buffers[conn] = b""
+                    outboxes[conn] = bytearray()
+                    logging.info(f"Node attached to hub ({len(buffers)} connected)")
+                    continue
+                if sock not in buffers:
+                    continue
+                try:
+                    chunk = sock.recv(65536)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    chunk = b""
+                if not chunk:
+                    detach(sock)
+                    continue
+                data = buffers[sock] + chunk
+                end = data.rfind(b"\n") + 1
+                buffers[sock] = data[end:]
+                if not end:
+                    continue
+                for peer in list(outboxes):
+                    if peer is sock:
+                        continue
+                    outboxes[peer] += data[:end]
+                    if len(outboxes[peer]) > max_pending:
+                        detach(peer, f"more than {max_pending} bytes waiting for a node that is not reading")
+    except KeyboardInterrupt:
+        logging.info("Shutting down backplane hub...")
+    finally:
+        for sock in buffers:
+            sock.close()
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Chat backplane relay hub")
+    parser.add_argument("--hub", default="/tmp/chat_backplane.sock", help="Unix socket path to listen on")
+    args = parser.parse_args()
+    run_hub(args.hub)
@@ -1,118 +1,354 @@
 #!/usr/bin/env python3
-import socket
-import threading
-import logging
-import time
+"""Chat client for chat_server.
+
+``ChatClient`` is an asyncio client that can be embedded in bots and services:
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', filename='chat_client.log', filemode='a')
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-logging.getLogger().addHandler(console)
+    client = ChatClient("127.0.0.1", 12345, username="bot", passkey="secret",
+                        on_message=print)
+    await client.connect()
+    await client.send("hello")
+    ...
+    await client.close()
+
+It reconnects with exponential backoff when the connection drops, answers the
+handshake again with the credentials it already has, and flushes messages that
+were sent while it was offline. Running this file starts the interactive
+client on top of it.
+"""
+import argparse
+import asyncio
+import collections
+import logging
+import random
 
 HOST = "192.168.0.39"  # Change to server IP
 PORT = 12345
 
-def receive_messages(sock):
-    while True:
-        try:
-            data = sock.recv(1024)
-            if not data:
-                print("Disconnected from server.")
-                logging.info("Disconnected from server (no data)")
-                break
-            print(data.decode(), end="")
-        except (ConnectionResetError, BrokenPipeError, OSError) as e:
-            print("Disconnected from server.")
-            logging.error(f"Receive error: {e}")
-            break
+# Text the server sends during the handshake
+PASSKEY_PROMPT = "Enter passkey:"
+USERNAME_PROMPT = "Enter your username:"
+WELCOME_TEXT = "Connection successful"
+REJECTED_TEXT = "Invalid passkey"
 
-def recv_until_prompt(sock, prompt_text, timeout=10, retries=3):
-    """Receive data until we get the expected prompt or timeout, with retries."""
-    sock.settimeout(timeout)
-    for attempt in range(1, retries + 1):
-        buffer = ""
-        try:
-            start_time = time.time()
-            while prompt_text not in buffer and time.time() - start_time < timeout:
-                chunk = sock.recv(1024).decode()
-                if not chunk:
-                    raise ConnectionError("Server closed connection")
-                buffer += chunk
-            if prompt_text in buffer:
-                print(buffer, end="")
-                logging.info(f"Received prompt '{prompt_text}' on attempt {attempt}")
-                return buffer
-            raise socket.timeout("Partial data received")
-        except socket.timeout:
-            logging.warning(f"Timeout waiting for '{prompt_text}' on attempt {attempt}")
-            if attempt < retries:
-                logging.info(f"Retrying ({attempt + 1}/{retries})...")
-                time.sleep(2)
-            continue
-        except (ConnectionResetError, BrokenPipeError, OSError) as e:
-            raise ConnectionError(f"Failed to connect: {e}")
-    raise ConnectionError(f"Timeout waiting for '{prompt_text}' after {retries} attempts")
+logger = logging.getLogger("chat_client")
 
-def main():
-    for attempt in range(1, 4):  # Retry entire connection process up to 3 times
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+def configure_logging():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', filename='chat_client.log', filemode='a')
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    logging.getLogger().addHandler(console)
+
+
+class AuthenticationError(ConnectionError):
+    """The server rejected our passkey; retrying with the same one won't help."""
+
+
+class PromptParser:
+    """Incremental parser for the server's byte stream.
+
+    Bytes are appended to one buffer and each byte is scanned only once (plus
+    a few bytes of overlap for prompts split across reads), so parsing stays
+    linear in the amount of data received. ``feed`` returns a list of
+    ``(event, text)`` tuples where event is one of ``passkey``, ``username``,
+    ``joined``, ``message`` or ``rejected``.
+    """
+
+    HANDSHAKE = "handshake"
+    WAIT_WELCOME = "wait_welcome"
+    CHAT = "chat"
+    REJECTED = "rejected"
+
+    _PROMPTS = ((PASSKEY_PROMPT.encode(), "passkey"), (USERNAME_PROMPT.encode(), "username"))
+    _LONGEST_PROMPT = max(len(marker) for marker, _ in _PROMPTS)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.state = self.HANDSHAKE
+        self._buffer = bytearray()
+        self._scan_from = 0
+        self._after_prompt = False
+
+    def feed(self, data):
+        self._buffer += data
+        events = []
+        while True:
+            event = self._step()
+            if event is None:
+                return events
+            events.append(event)
+
+    def _consume_line(self, newline):
+        line = self._buffer[:newline].decode(errors="replace").rstrip("\r")
+        del self._buffer[:newline + 1]
+        self._scan_from = 0
+        return line
+
+    def _step(self):
+        buffer = self._buffer
+        if self._after_prompt:
+            # Drop the space the server puts after a prompt's colon, which may
+            # arrive in a later read than the prompt itself
+            spaces = len(buffer) - len(buffer.lstrip(b" "))
+            del buffer[:spaces]
+            if not buffer:
+                return None
+            self._after_prompt = False
+        if self.state == self.HANDSHAKE:
+            # Prompts are not newline-terminated, so look for them directly
+            newline = buffer.find(b"\n", self._scan_from)
+            found = None
+            for marker, event in self._PROMPTS:
+                index = buffer.find(marker, self._scan_from)
+                if index != -1 and (found is None or index < found[0]):
+                    found = (index, marker, event)
+            if found and (newline == -1 or found[0] < newline):
+                index, marker, event = found
+                del buffer[:index + len(marker)]
+                self._scan_from = 0
+                self._after_prompt = True
+                if event == "username":
+                    self.state = self.WAIT_WELCOME
+                return event, None
+            if newline != -1:
+                line = self._consume_line(newline)
+                if REJECTED_TEXT in line:
+                    self.state = self.REJECTED
+                    return "rejected", line
+                return "message", line
+            self._scan_from = max(0, len(buffer) - self._LONGEST_PROMPT + 1)
+            return None
+
+        if self.state == self.REJECTED:
+            return None
+
+        newline = buffer.find(b"\n", self._scan_from)
+        if newline == -1:
+            self._scan_from = len(buffer)
+            return None
+        line = self._consume_line(newline)
+        if self.state == self.WAIT_WELCOME and WELCOME_TEXT in line:
+            self.state = self.CHAT
+            return "joined", line
+        return "message", line
+
+
+class ChatClient:
+    """Asyncio chat client with automatic reconnect and session resume.
+
+    ``on_message`` is called with every chat line received; without it lines
+    are queued for ``messages()``. ``ask`` is an optional coroutine function
+    called with the prompt text when the server wants a passkey or username
+    that was not given up front. The answer is remembered for reconnects.
+    """
+
+    def __init__(self, host, port, username=None, passkey=None, on_message=None, ask=None,
+                 reconnect=True, backoff_initial=0.5, backoff_max=30.0, connect_timeout=10.0,
+                 max_pending=1000):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.passkey = passkey
+        self.on_message = on_message
+        self.ask = ask
+        self.reconnect = reconnect
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.connected = False
+        self.reconnects = 0
+        self._reader = None
+        self._writer = None
+        self._parser = PromptParser()
+        self._pending = collections.deque(maxlen=max_pending)
+        self._inbox = asyncio.Queue()
+        self._closing = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._reader_task = None
+
+    async def connect(self):
+        """Connect and complete the handshake; raises ConnectionError on failure."""
+        await asyncio.wait_for(self._open(), self.connect_timeout)
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def _open(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
         try:
-            sock.connect((HOST, PORT))
-            logging.info(f"Connected to server on attempt {attempt}")
+            await self._handshake()
+        except BaseException:
+            self._writer.close()
+            raise
+        self.connected = True
+        logger.info(f"Joined {self.host}:{self.port} as {self.username}")
+        while self._pending:
+            await self._write_line(self._pending.popleft())
+
+    async def _handshake(self):
+        self._parser.reset()
+        while self._parser.state != PromptParser.CHAT:
+            chunk = await self._reader.read(4096)
+            if not chunk:
+                raise ConnectionError("Server closed connection during handshake")
+            for event, text in self._parser.feed(chunk):
+                if event == "passkey":
+                    if self.passkey is None:
+                        self.passkey = await self._ask(PASSKEY_PROMPT)
+                    await self._write_line(self.passkey)
+                elif event == "username":
+                    if self.username is None:
+                        self.username = await self._ask(USERNAME_PROMPT)
+                    await self._write_line(self.username)
+                elif event == "rejected":
+                    raise AuthenticationError(text)
+                elif event == "message":
+                    self._deliver(text)
+
+    async def _ask(self, prompt_text):
+        if self.ask is None:
+            return ""
+        return await self.ask(prompt_text)
+
+    async def _write_line(self, text):
+        self._writer.write(text.encode() + b"\n")
+        await self._writer.drain()
+
+    def _deliver(self, line):
+        if self.on_message:
+            self.on_message(line)
+        else:
+            self._inbox.put_nowait(line)
+
+    async def _read_loop(self):
+        while True:
+            try:
+                chunk = await self._reader.read(65536)
+            except (ConnectionResetError, OSError) as e:
+                logger.error(f"Receive error: {e}")
+                chunk = b""
+            if chunk:
+                for event, text in self._parser.feed(chunk):
+                    self._deliver(text)
+                continue
+
+            self.connected = False
+            self._writer.close()
+            if self._closing.is_set() or not self.reconnect:
+                break
+            logger.info("Disconnected from server, reconnecting...")
+            if not await self._reconnect():
+                break
+        self._closed.set()
 
-            # Handle passkey prompt (if any)
-            recv_until_prompt(sock, "Enter passkey:", timeout=10, retries=3)
-            passkey = input()
-            sock.sendall((passkey + "\n").encode())
+    async def _reconnect(self):
+        delay = self.backoff_initial
+        while not self._closing.is_set():
+            # Full jitter keeps a crowd of clients from reconnecting in lockstep;
+            # waiting on the close event lets close() cut the backoff short
+            try:
+                await asyncio.wait_for(self._closing.wait(), random.uniform(0, delay))
+                return False
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.wait_for(self._open(), self.connect_timeout)
+                self.reconnects += 1
+                return True
+            except AuthenticationError as e:
+                logger.error(f"Reconnect rejected: {e}")
+                return False
+            except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+                logger.warning(f"Reconnect failed: {e}")
+                delay = min(self.backoff_max, delay * 2)
+        return False
 
-            # Handle username prompt
-            recv_until_prompt(sock, "Enter your username:", timeout=10, retries=3)
-            username = input()
-            sock.sendall((username + "\n").encode())
+    async def send(self, text):
+        """Send a chat message; it is held and sent after a reconnect if offline."""
+        if not self.connected:
+            self._pending.append(text)
+            return
+        try:
+            await self._write_line(text)
+        except (ConnectionResetError, BrokenPipeError, OSError):
+            self._pending.append(text)
 
-            # Wait for connection confirmation
-            buffer = recv_until_prompt(sock, "Connection successful", timeout=10, retries=3)
-            if "Connection successful" not in buffer:
-                print("Failed to join the chat. Server may be full or in an error state.")
-                logging.error("Failed to receive connection confirmation")
-                continue  # Retry connection
+    async def messages(self):
+        """Yield received chat lines until the client is closed."""
+        while not (self._closed.is_set() and self._inbox.empty()):
+            getter = asyncio.ensure_future(self._inbox.get())
+            closed = asyncio.ensure_future(self._closed.wait())
+            done, _ = await asyncio.wait({getter, closed}, return_when=asyncio.FIRST_COMPLETED)
+            closed.cancel()
+            if getter in done:
+                yield getter.result()
+            else:
+                getter.cancel()
 
-            # Start listening for incoming chat messages
-            threading.Thread(target=receive_messages, args=(sock,), daemon=True).start()
+    async def wait_closed(self):
+        await self._closed.wait()
 
+    async def close(self):
+        """Leave the chat and stop reconnecting."""
+        self._closing.set()
+        if self.connected:
             try:
-                while True:
-                    msg = input()
-                    sock.sendall((msg + "\n").encode())
-                    if msg.lower() == "/quit":
-                        break
-            except KeyboardInterrupt:
-                logging.info("Client interrupted (Ctrl+C)")
-                try:
-                    sock.sendall(b"/quit\n")
-                except:
-                    pass
-            except (ConnectionResetError, BrokenPipeError, OSError) as e:
-                print("Disconnected from server.")
-                logging.error(f"Send error: {e}")
-            break  # Exit retry loop on successful connection
-        except ConnectionError as e:
-            print(f"Connection error: {e}")
-            logging.error(f"Connection error on attempt {attempt}: {e}")
-            if attempt < 3:
-                logging.info(f"Retrying connection ({attempt + 1}/3)...")
-                time.sleep(2)
-        finally:
+                await self._write_line("/quit")
+            except (ConnectionResetError, BrokenPipeError, OSError):
+                pass
+        elif self._reader_task:
+            # Mid-reconnect: don't wait out a connect attempt that may hang
+            self._reader_task.cancel()
+        if self._writer:
+            self._writer.close()
+        if self._reader_task:
             try:
-                sock.close()
-            except:
+                await self._reader_task
+            except asyncio.CancelledError:
                 pass
-            logging.info("Client socket closed")
-    else:
-        print("Failed to connect to server after 3 attempts.")
-        logging.error("Failed to connect to server after 3 attempts")
+        self._closed.set()
+
+
+async def run_interactive(host, port, username=None, passkey=None):
+    loop = asyncio.get_running_loop()
+
+    async def ask(prompt_text):
+        return (await loop.run_in_executor(None, input, prompt_text + " ")).strip()
+
+    # No connect timeout: the handshake waits on the user typing answers
+    client = ChatClient(host, port, username=username, passkey=passkey, ask=ask,
+                        on_message=print, connect_timeout=None)
+    try:
+        await client.connect()
+    except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+        print(f"Connection error: {e}")
+        logger.error(f"Connection error: {e}")
+        return
+    print("Connection successful. Type /quit to leave.")
+
+    while True:
+        try:
+            msg = await loop.run_in_executor(None, input)
+        except EOFError:
+            break
+        if msg.lower() == "/quit":
+            break
+        await client.send(msg)
+    await client.close()
+    logger.info("Client closed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat client")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--username", help="Skip the username prompt")
+    parser.add_argument("--passkey", help="Skip the passkey prompt")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_interactive(args.host, args.port, args.username, args.passkey))
+    except KeyboardInterrupt:
+        logger.info("Client interrupted (Ctrl+C)")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    configure_logging()
+    main()
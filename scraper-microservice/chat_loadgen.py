@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Headless load generator and latency benchmark for chat_server.
+
+Opens many simulated chat clients against a local server, drives each one
+through the passkey/username handshake with chat_client.ChatClient, and has a subset
+of them send timestamped messages at a fixed rate. Every client records when
+those messages arrive, which gives the end-to-end fan-out latency.
+
+Example (starts its own server on a spare port):
+
+    python chat_loadgen.py --spawn-server --clients 500 --senders 20 --rate 2 --duration 30
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import re
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+from chat_client import ChatClient
+
+logger = logging.getLogger("chat_loadgen")
+
+# Payload: lg:<sender index>:<sequence>:<perf_counter_ns at send time>
+PROBE_RE = re.compile(r"lg:(\d+):(\d+):(\d+)")
+
+
+class LoadStats:
+    def __init__(self):
+        self.connect_times = []
+        self.connect_failures = 0
+        self.latencies = []
+        self.sent = 0
+        self.received = 0
+        self.disconnects = 0
+        self.peak_rss_kb = 0
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def read_rss_kb(pid):
+    """Return the resident set size of a process in KB (Linux only), or 0."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def raise_fd_limit(needed):
+    """Thousands of sockets need more file descriptors than the usual default."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        logger.info(f"Raised open file limit from {soft} to {target}")
+
+
+async def connect_client(index, args, stats):
+    """Open a client and complete the handshake, recording how long it took."""
+    def on_message(line):
+        match = PROBE_RE.search(line)
+        if match:
+            stats.received += 1
+            stats.latencies.append((time.perf_counter_ns() - int(match.group(3))) / 1e6)
+
+    client = ChatClient(args.host, args.port, username=f"{args.username_prefix}{index}",
+                        passkey=args.passkey or "", on_message=on_message, reconnect=False)
+    started = time.perf_counter()
+    await client.connect()
+    stats.connect_times.append(time.perf_counter() - started)
+    return client
+
+
+async def watch_disconnect(client, stats, stop):
+    await client.wait_closed()
+    if not stop.is_set():
+        stats.disconnects += 1
+
+
+async def send_loop(index, client, args, stats, stop):
+    interval = 1.0 / args.rate
+    # Spread senders out so they don't all fire on the same tick
+    await asyncio.sleep(random.uniform(0, interval))
+    seq = 0
+    next_send = time.perf_counter()
+    while not stop.is_set() and client.connected:
+        await client.send(f"lg:{index}:{seq}:{time.perf_counter_ns()}")
+        stats.sent += 1
+        seq += 1
+        next_send += interval
+        await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+
+
+async def sample_rss(pid, stats, stop):
+    while not stop.is_set():
+        stats.peak_rss_kb = max(stats.peak_rss_kb, read_rss_kb(pid))
+        await asyncio.sleep(0.5)
+
+
+async def run_load(args, server_pid=None):
+    stats = LoadStats()
+    stop = asyncio.Event()
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+    connections = []
+
+    async def open_one(index):
+        async with semaphore:
+            try:
+                connections.append((index, await connect_client(index, args, stats)))
+            except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+                stats.connect_failures += 1
+                logger.warning(f"Client {index} failed to connect: {e}")
+
+    tasks = []
+    idle_rss_kb = 0
+    if server_pid:
+        tasks.append(asyncio.create_task(sample_rss(server_pid, stats, stop)))
+        idle_rss_kb = read_rss_kb(server_pid)
+
+    connect_started = time.perf_counter()
+    await asyncio.gather(*(open_one(i) for i in range(args.clients)))
+    connect_elapsed = time.perf_counter() - connect_started
+    logger.info(f"{len(connections)} clients connected in {connect_elapsed:.2f}s")
+
+    for index, client in connections:
+        tasks.append(asyncio.create_task(watch_disconnect(client, stats, stop)))
+    for index, client in connections[:args.senders]:
+        tasks.append(asyncio.create_task(send_loop(index, client, args, stats, stop)))
+
+    load_started = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    stop.set()
+    load_elapsed = time.perf_counter() - load_started
+    # Give in-flight messages a moment to arrive
+    await asyncio.sleep(min(1.0, args.duration))
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.gather(*(client.close() for _, client in connections), return_exceptions=True)
+
+    report = {
+        "clients_requested": args.clients,
+        "clients_connected": len(connections),
+        "connect_failures": stats.connect_failures,
+        "connect_wall_s": round(connect_elapsed, 3),
+        "duration_s": round(load_elapsed, 3),
+        "sent": stats.sent,
+        "sent_per_s": round(stats.sent / load_elapsed, 1),
+        "delivered": stats.received,
+        "delivered_per_s": round(stats.received / load_elapsed, 1),
+        "disconnects": stats.disconnects,
+    }
+    connect_ms = sorted(t * 1000 for t in stats.connect_times)
+    latencies = sorted(stats.latencies)
+    for pct in (50, 90, 99):
+        report[f"connect_p{pct}_ms"] = round(percentile(connect_ms, pct), 2)
+    for pct in (50, 90, 99, 99.9):
+        report[f"fanout_p{pct}_ms"] = round(percentile(latencies, pct), 2)
+    report["fanout_max_ms"] = round(latencies[-1], 2) if latencies else 0.0
+    if server_pid:
+        report["server_rss_idle_mb"] = round(idle_rss_kb / 1024, 1)
+        report["server_rss_peak_mb"] = round(stats.peak_rss_kb / 1024, 1)
+    return report
+
+
+def spawn_server(args):
+    """Start chat_server.py on localhost and wait until it accepts connections."""
+    server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_server.py")
+    proc = subprocess.Popen(
+        [sys.executable, server_path, "--port", str(args.port), "--passkey", args.passkey or ""],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((args.host, args.port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"chat_server did not start listening on {args.host}:{args.port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat server load generator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--passkey", default="", help="Passkey to answer the server's prompt with")
+    parser.add_argument("--clients", type=int, default=200, help="Number of simulated clients")
+    parser.add_argument("--senders", type=int, default=10, help="How many of the clients send messages")
+    parser.add_argument("--rate", type=float, default=1.0, help="Messages per second per sender")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to send for")
+    parser.add_argument("--connect-concurrency", type=int, default=100, help="Handshakes in flight at once")
+    parser.add_argument("--username-prefix", default="bot")
+    parser.add_argument("--server-pid", type=int, help="PID of an already running server, for RSS sampling")
+    parser.add_argument("--spawn-server", action="store_true", help="Start a local chat_server for the run")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Per-client join/leave chatter from thousands of clients would drown the report
+    logging.getLogger("chat_client").setLevel(logging.WARNING)
+    raise_fd_limit(args.clients + 256)
+
+    proc = None
+    if args.spawn_server:
+        proc = spawn_server(args)
+    try:
+        report = asyncio.run(run_load(args, server_pid=proc.pid if proc else args.server_pid))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+    width = max(len(key) for key in report)
+    for key, value in report.items():
+        print(f"{key:<{width}}  {value}")
+
+
+if __name__ == "__main__":
+    main()
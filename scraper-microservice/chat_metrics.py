@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Runtime metrics for chat_server and a small local HTTP endpoint to read them.
+
+    python chat_server.py --metrics-port 9100
+    curl http://127.0.0.1:9100/stats
+"""
+import array
+import bisect
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in milliseconds; the last bucket catches everything slower
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf"))
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the given percentile, capped at the max."""
+        if not self.count:
+            return 0.0
+        target = pct / 100 * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return round(min(bound, self.max), 3)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max, 3),
+            "buckets": {("+Inf" if b == float("inf") else str(b)): n for b, n in zip(self.buckets, self.counts)},
+        }
+
+
+class ServerMetrics:
+    """Counters and histograms shared by every client thread."""
+
+    COUNTERS = ("connections_total", "handshake_timeouts", "handshake_failures",
+                "messages_in", "bytes_in", "messages_out", "bytes_out", "send_errors")
+    RATES = ("messages_in", "bytes_in", "messages_out", "bytes_out")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.fanout = Histogram()
+        self.lock_wait = Histogram()
+        self.rates = dict.fromkeys(self.RATES, 0.0)
+        self._last_sample = (time.monotonic(), dict(self.counters))
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def observe_fanout(self, ms):
+        with self._lock:
+            self.fanout.observe(ms)
+
+    def observe_lock_wait(self, ms):
+        with self._lock:
+            self.lock_wait.observe(ms)
+
+    def sample_rates(self):
+        """Turn counter deltas since the previous call into per-second rates."""
+        now = time.monotonic()
+        with self._lock:
+            then, previous = self._last_sample
+            elapsed = max(now - then, 1e-9)
+            for name in self.RATES:
+                self.rates[name] = round((self.counters[name] - previous[name]) / elapsed, 1)
+            self._last_sample = (now, dict(self.counters))
+
+    def start_sampler(self, interval=1.0):
+        def run():
+            while True:
+                time.sleep(interval)
+                self.sample_rates()
+        threading.Thread(target=run, name="metrics-sampler", daemon=True).start()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "counters": dict(self.counters),
+                "per_second": dict(self.rates),
+                "fanout_latency": self.fanout.snapshot(),
+                "lock_wait": self.lock_wait.snapshot(),
+            }
+
+
+class TimedLock:
+    """Re-entrant lock that records how long callers waited to acquire it."""
+
+    def __init__(self, metrics):
+        self._lock = threading.RLock()
+        self._metrics = metrics
+
+    def __enter__(self):
+        started = time.perf_counter()
+        self._lock.acquire()
+        self._metrics.observe_lock_wait((time.perf_counter() - started) * 1000)
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+def outbound_queue_bytes(sock):
+    """Bytes written to a socket that the peer hasn't acknowledged yet (Linux).
+
+    Returns None where the ioctl is unavailable, e.g. on Windows or macOS.
+    """
+    try:
+        import fcntl
+        import termios
+        request = termios.TIOCOUTQ
+    except (ImportError, AttributeError):
+        return None
+    buf = array.array("i", [0])
+    try:
+        fcntl.ioctl(sock.fileno(), request, buf)
+    except (OSError, ValueError):
+        return None
+    return buf[0]
+
+
+def serve_metrics(snapshot_fn, host="127.0.0.1", port=9100):
+    """Serve ``snapshot_fn()`` as JSON on GET /stats from a background thread."""
+
+    class StatsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/stats":
+                self.send_error(404)
+                return
+            body = json.dumps(snapshot_fn(), indent=2).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep polling out of chat_server.log
+
+    httpd = ThreadingHTTPServer((host, port), StatsHandler)
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info(f"Metrics endpoint at http://{host}:{port}/stats")
+    return httpd
@@ -4,6 +4,12 @@ import threading
 import select
 import logging
 import errno
+import argparse
+import os
+import time
+
+from chat_backplane import MessageDeduper, create_backplane, new_message_id
+from chat_metrics import ServerMetrics, TimedLock, outbound_queue_bytes, serve_metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', filename='chat_server.log', filemode='a')
@@ -14,20 +20,42 @@ logging.getLogger().addHandler(console)
 HOST = "0.0.0.0"
 PORT = 12345
 PASSKEY = None  # Will be set at startup
+NODE_ID = socket.gethostname()
 
 clients = {}
-lock = threading.Lock()
+metrics = ServerMetrics()
+# Re-entrant: broadcast() is called again while held when it drops dead clients
+lock = TimedLock(metrics)
+backplane = None  # Set at startup when running as one node of several
+deduper = MessageDeduper()
 
 def broadcast(message, sender=None):
-    """Send a message to all connected clients."""
+    """Send a message to every client in the room, on this node and all others."""
+    msg_id = new_message_id(NODE_ID)
+    deliver_local(msg_id, message)
+    if backplane:
+        backplane.publish(msg_id, message)
+
+def deliver_local(msg_id, message):
+    """Send a message to the clients connected to this node, once per message ID."""
+    if not deduper.first_time(msg_id):
+        return
+    started = time.perf_counter()
+    data = message.encode()
     with lock:
         dead_clients = []
+        sent = 0
         for conn in list(clients.keys()):
             try:
-                conn.sendall(message.encode())
+                conn.sendall(data)
+                sent += 1
             except (ConnectionResetError, BrokenPipeError, OSError) as e:
                 logging.error(f"Failed to send to {clients.get(conn, 'unknown')}: {e}")
                 dead_clients.append(conn)
+        metrics.incr("messages_out", sent)
+        metrics.incr("bytes_out", sent * len(data))
+        metrics.incr("send_errors", len(dead_clients))
+        metrics.observe_fanout((time.perf_counter() - started) * 1000)
         for dc in dead_clients:
             if dc in clients:
                 uname = clients.pop(dc)
@@ -38,6 +66,20 @@ def broadcast(message, sender=None):
                 logging.info(f"Client {uname} disconnected")
                 broadcast(f"*** {uname} disconnected ***\n")
 
+def stats_snapshot():
+    """Live server state for the metrics endpoint."""
+    with lock:
+        members = []
+        for conn, username in clients.items():
+            try:
+                addr = "%s:%d" % conn.getpeername()[:2]
+            except OSError:
+                addr = None
+            members.append({"username": username, "addr": addr, "outbound_queue_bytes": outbound_queue_bytes(conn)})
+    snapshot = metrics.snapshot()
+    snapshot.update({"node_id": NODE_ID, "connected_clients": len(members), "clients": members})
+    return snapshot
+
 def is_socket_closed(sock):
     """Check if the socket is closed or broken."""
     try:
@@ -53,6 +95,7 @@ def is_socket_closed(sock):
 
 def handle_client(conn, addr):
     logging.info(f"New connection from {addr}")
+    metrics.incr("connections_total")
     try:
         # Set socket to non-blocking
         conn.setblocking(False)
@@ -69,6 +112,7 @@ def handle_client(conn, addr):
             readable, _, errors = select.select([conn], [], [conn], 10)
             if errors or not readable:
                 logging.info(f"Timeout or error waiting for passkey from {addr}")
+                metrics.incr("handshake_timeouts")
                 conn.close()
                 return
             try:
@@ -84,6 +128,7 @@ def handle_client(conn, addr):
                     pass
                 conn.close()
                 logging.info(f"Invalid passkey from {addr}")
+                metrics.incr("handshake_failures")
                 return
 
         # Ask for username
@@ -96,6 +141,7 @@ def handle_client(conn, addr):
         readable, _, errors = select.select([conn], [], [conn], 10)
         if errors or not readable:
             logging.info(f"Timeout or error waiting for username from {addr}")
+            metrics.incr("handshake_timeouts")
             conn.close()
             return
         try:
@@ -107,6 +153,7 @@ def handle_client(conn, addr):
         if not username:
             conn.close()
             logging.info(f"No username provided from {addr}")
+            metrics.incr("handshake_failures")
             return
 
         with lock:
@@ -137,11 +184,21 @@ def handle_client(conn, addr):
                     if not data:
                         logging.info(f"Client {username} disconnected (no data)")
                         break
-                    msg = data.decode().strip()
-                    if msg.lower() == "/quit":
+                    metrics.incr("bytes_in", len(data))
+                    # One recv() can hold several lines when a client sends quickly
+                    quit_requested = False
+                    for line in data.decode().splitlines():
+                        msg = line.strip()
+                        if not msg:
+                            continue
+                        if msg.lower() == "/quit":
+                            quit_requested = True
+                            break
+                        metrics.incr("messages_in")
+                        broadcast(f"[{username}] {msg}\n")
+                    if quit_requested:
                         logging.info(f"Client {username} quit explicitly")
                         break
-                    broadcast(f"[{username}] {msg}\n")
                 except (ConnectionResetError, BrokenPipeError, OSError) as e:
                     logging.info(f"Receive error for {username}: {e}")
                     break
@@ -162,20 +219,48 @@ def handle_client(conn, addr):
         logging.info(f"Closed connection for {addr}")
 
 def main():
-    global PASSKEY
-    # Prompt for passkey
-    PASSKEY = input("Set a passkey (leave empty for open chat): ").strip()
+    global PASSKEY, NODE_ID, backplane
+    parser = argparse.ArgumentParser(description="Chat server")
+    parser.add_argument("--port", type=int, default=PORT, help="TCP port to listen on")
+    parser.add_argument("--backplane", help="Share the room with other nodes, e.g. unix:/tmp/chat_backplane.sock or redis://localhost:6379/0")
+    parser.add_argument("--node-id", help="Unique name of this node (default: hostname-pid)")
+    parser.add_argument("--reuse-port", action="store_true", help="Let several nodes listen on the same port (SO_REUSEPORT)")
+    parser.add_argument("--metrics-port", type=int, help="Serve live stats as JSON on http://127.0.0.1:PORT/stats")
+    parser.add_argument("--passkey", help="Room passkey; skips the startup prompt (pass \"\" for an open room)")
+    args = parser.parse_args()
+    if args.reuse_port and not args.backplane:
+        # Each node would hold its own isolated room and clients would land in one at random
+        parser.error("--reuse-port needs --backplane so the nodes share one room")
+
+    if args.passkey is not None:
+        PASSKEY = args.passkey.strip()
+    else:
+        # Prompt for passkey
+        PASSKEY = input("Set a passkey (leave empty for open chat): ").strip()
     if not PASSKEY:
         PASSKEY = None
         logging.info("No passkey set — room is open.")
     else:
         logging.info("Passkey set — users must enter it to join.")
 
+    if args.backplane:
+        NODE_ID = args.node_id or f"{socket.gethostname()}-{os.getpid()}"
+        backplane = create_backplane(args.backplane, NODE_ID)
+        backplane.start(deliver_local)
+        logging.info(f"Node {NODE_ID} joined backplane {args.backplane}")
+
+    metrics.start_sampler()
+    if args.metrics_port:
+        serve_metrics(stats_snapshot, port=args.metrics_port)
+
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server.bind((HOST, PORT))
-    server.listen(5)  # Allow up to 5 queued connections
-    logging.info(f"Server listening on {HOST}:{PORT}...")
+    if args.reuse_port:
+        # The kernel load-balances new connections across every node on this port
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server.bind((HOST, args.port))
+    server.listen(128)
+    logging.info(f"Server listening on {HOST}:{args.port}...")
 
     try:
         while True:
@@ -200,6 +285,8 @@ def main():
                 except:
                     pass
             clients.clear()
+        if backplane:
+            backplane.close()
         server.close()
         logging.info("Server closed")
 
@@ -0,0 +1,193 @@
+"""Cached, concurrent LLM extraction of streaming offers from detail pages.
+
+``ExtractionService`` reduces a page with html_reducer, then looks the result
+up in a cache keyed by a hash of the reduced HTML, the model and the prompt
+version. Misses go through a bounded job queue, where a fixed number of
+workers call the local Ollama server. Ollama streams its output token by
+token; a worker stops reading as soon as a complete JSON object has arrived,
+instead of waiting for the model to finish talking.
+
+streaming_service uses it as a fallback when the selector scrapers come back
+empty, and exposes it as ``POST /extract``.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+
+import requests
+from cachetools import TTLCache
+
+from ai_data_extractor import CHUNK_TOKENS, MODEL, OLLAMA_URL, PROMPT_VERSION, build_prompt, merge_results
+from html_reducer import chunk_regions, reduce_html
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalJSONParser:
+    """Find the first complete top-level JSON object in a growing text stream.
+
+    Each character is looked at once, tracking brace depth and string state,
+    so the object can be decoded the moment its closing brace arrives.
+    """
+
+    def __init__(self):
+        self.text = []
+        self._length = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, token):
+        """Add a token; return the parsed object once it is complete, else None."""
+        offset = self._length
+        self.text.append(token)
+        self._length += len(token)
+        for i, ch in enumerate(token):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"' and self._start is not None:
+                self._in_string = True
+            elif ch == "{":
+                if self._start is None:
+                    self._start = offset + i
+                self._depth += 1
+            elif ch == "}" and self._start is not None:
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = "".join(self.text)[self._start:offset + i + 1]
+                    try:
+                        return json.loads(candidate)
+                    except json.JSONDecodeError:
+                        self._start = None  # Not JSON after all; look for the next object
+        return None
+
+    def result(self):
+        """Best effort parse of everything received, for streams that ended early."""
+        try:
+            return json.loads("".join(self.text).strip())
+        except json.JSONDecodeError:
+            return None
+
+
+class ExtractionService:
+    """Bounded-concurrency, cached front end to the local Ollama server."""
+
+    def __init__(self, ollama_url=OLLAMA_URL, model=MODEL, concurrency=2, queue_size=100,
+                 cache_size=1000, cache_ttl=604800, chunk_tokens=CHUNK_TOKENS, request_timeout=120):
+        self.ollama_url = ollama_url
+        self.model = model
+        self.concurrency = concurrency
+        self.chunk_tokens = chunk_tokens
+        self.request_timeout = request_timeout
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = {"hits": 0, "misses": 0, "joined_in_flight": 0, "llm_calls": 0, "errors": 0}
+        self._in_flight = {}
+        self._workers = []
+
+    async def start(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        logger.info(f"Extraction service started with {self.concurrency} worker(s)")
+
+    async def stop(self):
+        for task in [*self._workers, *self._in_flight.values()]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._in_flight.values(), return_exceptions=True)
+        self._workers = []
+
+    def cache_key(self, chunks):
+        digest = hashlib.sha256()
+        for part in (PROMPT_VERSION, self.model, *chunks):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    async def extract(self, html):
+        """Return ``{"stream": [{"platform", "url"}, ...]}`` for a detail page."""
+        chunks = await asyncio.to_thread(lambda: chunk_regions(reduce_html(html), self.chunk_tokens))
+        if not chunks:
+            return {"stream": []}
+        key = self.cache_key(chunks)
+        if key in self.cache:
+            self.stats["hits"] += 1
+            return self.cache[key]
+        task = self._in_flight.get(key)
+        if task is not None:
+            # Same page already being extracted; share its result
+            self.stats["joined_in_flight"] += 1
+        else:
+            self.stats["misses"] += 1
+            # Its own task, so a cancelled caller neither fails the callers that
+            # joined it nor throws away model calls that are already queued
+            task = asyncio.create_task(self._extract_chunks(key, chunks))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()  # Every caller may have gone away; don't log it as never retrieved
+
+    async def _extract_chunks(self, key, chunks):
+        jobs = []
+        for chunk in chunks:
+            job = asyncio.get_running_loop().create_future()
+            await self.queue.put((build_prompt(chunk), job))  # Waits when the queue is full
+            jobs.append(job)
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        answers = [r for r in results if isinstance(r, dict)]
+        if not answers:
+            failure = next((r for r in results if isinstance(r, BaseException)), None)
+            raise failure or ValueError("Model returned no JSON object for any chunk")
+        result = merge_results(answers)
+        if len(answers) == len(results):
+            self.cache[key] = result  # Don't cache partial answers
+        return result
+
+    async def _worker(self):
+        while True:
+            prompt, job = await self.queue.get()
+            try:
+                self.stats["llm_calls"] += 1
+                result = await asyncio.to_thread(self._generate, prompt)
+                if not job.done():
+                    job.set_result(result)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Extraction failed: {e}")
+                if not job.done():
+                    job.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    def _generate(self, prompt):
+        """Stream one completion from Ollama and return the first JSON object in it."""
+        parser = IncrementalJSONParser()
+        with requests.post(
+            self.ollama_url,
+            json={"model": self.model, "prompt": prompt, "stream": True, "options": {"temperature": 0}},
+            stream=True,
+            timeout=self.request_timeout,
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                message = json.loads(line)
+                parsed = parser.feed(message.get("response", ""))
+                if parsed is not None:
+                    return parsed  # Closing the response stops generation early
+                if message.get("done"):
+                    break
+        parsed = parser.result()
+        if parsed is None:
+            raise ValueError("Model output contained no JSON object")
+        return parsed
@@ -0,0 +1,193 @@
+"""Per-title fingerprints of streaming-site detail pages.
+
+When a cached result expires, streaming_service has to look at the detail
+page again, but offers rarely change. For each site and title the store keeps
+the detail URL, the page's ETag/Last-Modified validators, a hash of its offer
+region and the platforms parsed from it. A refresh can then:
+
+* skip the search page and go straight to the known detail URL,
+* skip the browser entirely when a conditional GET answers 304 Not Modified,
+* skip parsing, normalization and the LLM fallback when the offer hash
+  matches the one recorded last time.
+
+``stats()`` reports how often refreshes short-circuit.
+"""
+import hashlib
+import logging
+import re
+import threading
+from html import unescape
+
+import requests
+from cachetools import LRUCache
+
+from html_reducer import OFFER_CLASS_RE, WHITESPACE_RE, is_provider_url, unwrap_redirect
+
+logger = logging.getLogger(__name__)
+
+ANCHOR_RE = re.compile(r"<a\b[^>]*?\bhref=\"([^\"]+)\"[^>]*>(.*?)</a>", re.S | re.I)
+TAG_RE = re.compile(r"<[^>]+>")
+CLASS_TAG_RE = re.compile(r"<[a-z][a-z0-9]*\b[^>]*?\bclass=\"([^\"]*)\"[^>]*>", re.I)
+SCRIPT_RE = re.compile(r"<(script|style)\b.*?</\1>", re.S | re.I)
+# How much text after an offer-class tag is hashed when no later offer block cuts it short
+OFFER_BLOCK_CHARS = 2000
+
+# What offer_hash gives a page with no provider links and no offer blocks at all
+NO_OFFERS_HASH = hashlib.sha256(b"").hexdigest()
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36"
+
+
+def text_of(html):
+    return WHITESPACE_RE.sub(" ", unescape(TAG_RE.sub(" ", SCRIPT_RE.sub(" ", html)))).strip()
+
+
+def offer_hash(html):
+    """Hash of the offers on a page, computed with regexes only.
+
+    Uses the provider links (with tracking redirects unwrapped) and their
+    text, which carries the offer type and price. Pages without provider
+    links fall back to the text following each offer-class element, up to
+    the next one.
+    """
+    parts = []
+    for href, inner in ANCHOR_RE.findall(html):
+        url = unwrap_redirect(unescape(href))
+        if is_provider_url(url):
+            parts.append(f"{url} {text_of(inner)}")
+    if not parts:
+        blocks = [m for m in CLASS_TAG_RE.finditer(html) if OFFER_CLASS_RE.search(m.group(1))]
+        for block, following in zip(blocks, blocks[1:] + [None]):
+            end = block.end() + OFFER_BLOCK_CHARS
+            if following is not None:
+                end = min(end, following.start())
+            parts.append(text_of(html[block.end():end]))
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+class FingerprintStore:
+    def __init__(self, maxsize=10000, request_timeout=5):
+        self.request_timeout = request_timeout
+        self._entries = LRUCache(maxsize=maxsize)
+        self._fallbacks = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._stats = {"first_seen": 0, "refreshes": 0, "not_modified": 0, "hash_unchanged": 0, "reparsed": 0, "fallback_reused": 0}
+
+    @staticmethod
+    def key(site, title, year):
+        return f"{title.lower()}_{year}_{site}"
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _entry(self, key):
+        with self._lock:  # Scrapers call in from worker threads, and LRU reads reorder the cache
+            return self._entries.get(key)
+
+    def detail_url(self, key):
+        entry = self._entry(key)
+        return entry["detail_url"] if entry else None
+
+    def check_not_modified(self, key, proxy=None):
+        """Conditional GET of the known detail URL, through ``proxy`` if given.
+
+        Returns the stored platforms on 304 Not Modified, otherwise None.
+        Blocking; run it in a thread from async code.
+        """
+        entry = self._entry(key)
+        if not entry:
+            return None
+        self._count("refreshes")
+        headers = {"User-Agent": USER_AGENT}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if len(headers) == 1:
+            return None  # Site sent no validators; only the hash check can help
+        try:
+            response = requests.get(
+                entry["detail_url"],
+                headers=headers,
+                proxies={"http": proxy, "https": proxy} if proxy else None,
+                timeout=self.request_timeout,
+                stream=True,
+            )
+            response.close()  # Body not needed either way
+        except requests.RequestException as e:
+            logger.warning(f"Conditional request failed for {entry['detail_url']}: {str(e)}")
+            return None
+        if response.status_code == 304:
+            self._count("not_modified")
+            logger.info(f"Not modified: {entry['detail_url']}")
+            return entry["platforms"]
+        return None
+
+    def unchanged(self, key, html, compare=True):
+        """Return ``(hash, platforms)``; platforms is None when the offers changed.
+
+        With ``compare=False`` only the hash is computed, for retries that
+        must parse the page regardless.
+        """
+        current = offer_hash(html)
+        if not compare:
+            return current, None
+        entry = self._entry(key)
+        if entry and entry["offer_hash"] == current:
+            self._count("hash_unchanged")
+            logger.info(f"Offer region unchanged for {key}, skipping parse")
+            return current, entry["platforms"]
+        self._count("reparsed" if entry else "first_seen")
+        return current, None
+
+    def record(self, key, detail_url, headers, offer_hash, platforms):
+        """Remember a parsed detail page.
+
+        A page with no offers at all is more likely a wrong or stale URL than
+        a title nobody streams, so it is forgotten and the next refresh
+        searches for the title again.
+        """
+        if not platforms and offer_hash == NO_OFFERS_HASH:
+            self.forget(key)
+            return
+        headers = headers or {}
+        entry = {
+            "detail_url": detail_url,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "offer_hash": offer_hash,
+            "platforms": platforms,
+        }
+        with self._lock:
+            self._entries[key] = entry
+
+    def forget(self, key):
+        """Drop everything known about one site's page for a title."""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._fallbacks.pop(key, None)
+
+    def fallback(self, key):
+        """Platforms the LLM fallback found last time on this site's page, if any."""
+        with self._lock:
+            platforms = self._fallbacks.get(key)
+        if platforms:
+            self._count("fallback_reused")
+        return platforms
+
+    def record_fallback(self, key, platforms):
+        """Remember what the LLM found on one site's page; an empty answer forgets the old one."""
+        with self._lock:
+            if platforms:
+                self._fallbacks[key] = platforms
+            else:
+                self._fallbacks.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["fingerprints"] = len(self._entries)
+        short_circuits = stats["not_modified"] + stats["hash_unchanged"]
+        stats["short_circuit_rate"] = round(short_circuits / stats["refreshes"], 3) if stats["refreshes"] else 0.0
+        return stats
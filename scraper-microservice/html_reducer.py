@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Shrink a streaming-site detail page down to the parts an LLM needs.
+
+A raw JustWatch detail page is well over a megabyte, almost all of it CSS,
+scripts, SVG icons and tracking attributes. ``reduce_html`` keeps only the
+candidate offer regions (links to known providers, "watch now" blocks) as
+minimal HTML, and ``chunk_regions`` packs those into prompt-sized chunks.
+
+Run it on a saved page to see how much it saves:
+
+    python html_reducer.py detail_page.html
+"""
+import argparse
+import re
+import time
+from urllib.parse import parse_qs, urlparse
+
+from bs4 import BeautifulSoup, Comment
+
+# Rough but stable for English/HTML text; good enough to budget prompts
+CHARS_PER_TOKEN = 4
+
+DROP_TAGS = ["script", "style", "svg", "noscript", "link", "meta", "source", "iframe", "template", "head", "button", "input", "form"]
+
+KNOWN_PROVIDERS = [
+    "netflix.com", "hulu.com", "primevideo.com", "amazon.com", "disneyplus.com", "max.com", "hbomax.com",
+    "tv.apple.com", "itunes.apple.com", "peacocktv.com", "paramountplus.com", "youtube.com", "play.google.com",
+    "vudu.com", "fandango.com", "fandangoathome.com", "microsoft.com", "tubitv.com", "pluto.tv", "therokuchannel.roku.com",
+    "crunchyroll.com", "starz.com", "sho.com", "amcplus.com", "mgmplus.com", "fubo.tv", "sling.com",
+    "spectrum.net", "directv.com", "plex.tv", "kanopy.com", "hoopladigital.com", "freevee.com",
+]
+
+OFFER_TEXT_RE = re.compile(r"\b(watch now|where to watch|stream(ing)?|rent|buy|subscription|free with ads)\b", re.I)
+OFFER_CLASS_RE = re.compile(r"offer|buybox-row|where-to-watch|streaming-option|affiliate", re.I)
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Tags that carry meaning for extraction; every other wrapper is flattened away
+KEEP_TAGS = {"a", "h1", "h2", "h3", "h4"}
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def unwrap_redirect(href):
+    """Return the provider URL hidden inside aggregator click-tracking links."""
+    parsed = urlparse(href)
+    if parsed.netloc.startswith("e.justwatch.com") or "/redirect" in parsed.path:
+        for key in ("r", "url", "u"):
+            target = parse_qs(parsed.query).get(key)
+            if target:
+                return target[0]
+    return href
+
+
+def is_provider_url(href):
+    host = urlparse(href).netloc.lower()
+    return any(host == p or host.endswith("." + p) for p in KNOWN_PROVIDERS)
+
+
+def clean_tree(soup):
+    """Drop non-content tags, comments and every attribute except ``href``.
+
+    Images are replaced by their alt text, since that is usually where the
+    provider name lives. Returns the ids of elements whose class looked like
+    an offer block, since the classes themselves are gone afterwards.
+    """
+    offer_hints = set()
+    for tag in soup.find_all(DROP_TAGS):
+        tag.decompose()
+    for comment in soup.find_all(string=lambda s: isinstance(s, Comment)):
+        comment.extract()
+    for img in soup.find_all("img"):
+        alt = img.get("alt", "").strip()
+        if alt:
+            img.replace_with(f" {alt} ")
+        else:
+            img.decompose()
+    for tag in soup.find_all(True):
+        href = tag.get("href")
+        classes = tag.get("class")
+        tag.attrs = {}
+        if href and tag.name == "a":
+            tag["href"] = unwrap_redirect(href)
+        if classes and OFFER_CLASS_RE.search(" ".join(classes)):
+            offer_hints.add(id(tag))
+    return offer_hints
+
+
+def compact(tag):
+    """Serialize an element as whitespace-collapsed HTML."""
+    return WHITESPACE_RE.sub(" ", str(tag)).replace("> <", "><").strip()
+
+
+def flatten(region):
+    """Serialize a region keeping only links and headings as markup."""
+    for tag in region.find_all(lambda t: t.name not in KEEP_TAGS):
+        tag.append(" ")  # Keep "<p>Runtime</p><p>124min</p>" from gluing together
+        tag.unwrap()
+    html = str(region) if region.name in KEEP_TAGS else region.decode_contents()
+    return WHITESPACE_RE.sub(" ", html).replace(" </", "</").replace("> ", ">").strip()
+
+
+def find_offer_regions(soup, offer_hints, max_region_chars=2000):
+    """Return the smallest elements that look like individual offers."""
+    candidates = []
+    for a in soup.find_all("a", href=True):
+        if is_provider_url(a["href"]) or id(a) in offer_hints or OFFER_TEXT_RE.search(a.get_text(" ")):
+            candidates.append(a)
+    for tag in soup.find_all(True):
+        if id(tag) in offer_hints and tag.name != "a":
+            candidates.append(tag)
+
+    regions = []
+    for tag in candidates:
+        # Climb to the enclosing offer block, but stop before it gets big
+        node = tag
+        while node.parent is not None and node.parent.name not in ("body", "[document]"):
+            parent = node.parent
+            if id(parent) in offer_hints and len(compact(parent)) <= max_region_chars:
+                node = parent
+            else:
+                break
+        regions.append(node)
+
+    # Drop regions nested inside another region, keeping document order
+    region_ids = {id(r) for r in regions}
+    outermost = [r for r in regions if not any(id(parent) in region_ids for parent in r.parents)]
+    kept, seen = [], set()
+    for region in outermost:
+        text = flatten(region)
+        if text in seen or not region.get_text(strip=True):
+            continue
+        seen.add(text)
+        kept.append(text)
+    return kept
+
+
+def reduce_html(html, max_region_chars=2000):
+    """Return the list of compact offer-region snippets found in a page."""
+    soup = BeautifulSoup(html, "html.parser")
+    offer_hints = clean_tree(soup)
+    return find_offer_regions(soup, offer_hints, max_region_chars)
+
+
+def chunk_regions(regions, max_tokens=1500):
+    """Pack regions into chunks of at most ``max_tokens`` estimated tokens.
+
+    A region that is larger than the budget on its own is split on character
+    boundaries so no chunk ever exceeds it.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks, current = [], ""
+    for region in regions:
+        while len(region) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(region[:max_chars])
+            region = region[max_chars:]
+        if current and len(current) + 1 + len(region) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{region}" if current else region
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure HTML pre-reduction on a saved detail page")
+    parser.add_argument("path", nargs="?", default="detail_page.html")
+    parser.add_argument("--max-tokens", type=int, default=1500, help="Token budget per chunk")
+    parser.add_argument("--show", action="store_true", help="Print the reduced chunks")
+    args = parser.parse_args()
+
+    with open(args.path, "r", encoding="utf-8") as file:
+        html = file.read()
+    started = time.perf_counter()
+    regions = reduce_html(html)
+    chunks = chunk_regions(regions, args.max_tokens)
+    elapsed = time.perf_counter() - started
+
+    reduced_chars = sum(len(c) for c in chunks)
+    print(f"Original page:    {len(html):>9,} chars  ~{estimate_tokens(html):>8,} tokens")
+    print(f"Reduced regions:  {reduced_chars:>9,} chars  ~{estimate_tokens(''.join(chunks)):>8,} tokens ({len(regions)} regions)")
+    print(f"Reduction:        {100 * (1 - reduced_chars / max(len(html), 1)):.2f}% smaller, {len(chunks)} chunk(s) of <= {args.max_tokens} tokens")
+    print(f"Reduction time:   {elapsed * 1000:.0f} ms")
+    if args.show:
+        for i, chunk in enumerate(chunks, 1):
+            print(f"\n--- chunk {i} (~{estimate_tokens(chunk)} tokens) ---\n{chunk}")
+
+
+if __name__ == "__main__":
+    main()
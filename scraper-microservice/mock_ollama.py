@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Stand-in for Ollama's /api/generate, for exercising the extraction service.
+
+Answers every prompt by listing the links in its HTML as offers, streamed as
+NDJSON a few characters at a time like the real server, followed by some
+trailing chatter that clients are free to ignore.
+
+    python mock_ollama.py --port 11434 --delay 0.01
+"""
+import argparse
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LINK_RE = re.compile(r'<a href="([^"]+)">([^<]*)</a>')
+
+
+def fake_answer(prompt):
+    offers = [{"platform": text.strip()[:40], "url": href}
+              for href, text in LINK_RE.findall(prompt) if href.startswith("http")]
+    return json.dumps({"stream": offers}, indent=2) + "\n\nLet me know if you need anything else!"
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    calls = 0
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        type(self).calls += 1
+        answer = fake_answer(body.get("prompt", ""))
+        tokens = [answer[i:i + 4] for i in range(0, len(answer), 4)]
+
+        if not body.get("stream", True):
+            payload = json.dumps({"model": body.get("model"), "response": answer, "done": True}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i, token in enumerate(tokens + [""]):
+                line = json.dumps({"model": body.get("model"), "response": token, "done": i == len(tokens)}) + "\n"
+                self.wfile.write(f"{len(line.encode()):x}\r\n".encode() + line.encode() + b"\r\n")
+                self.wfile.flush()
+                time.sleep(self.delay)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client got its JSON and hung up early
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=11434, delay=0.0):
+    MockOllamaHandler.delay = delay
+    return ThreadingHTTPServer(("127.0.0.1", port), MockOllamaHandler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Ollama server")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--delay", type=float, default=0.01, help="Seconds between streamed tokens")
+    args = parser.parse_args()
+    print(f"Mock Ollama listening on http://127.0.0.1:{args.port}/api/generate")
+    serve(args.port, args.delay).serve_forever()
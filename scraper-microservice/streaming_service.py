@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from pyppeteer import launch
 from bs4 import BeautifulSoup
 import asyncio
+import os
 import time
 import random
 from cachetools import TTLCache
@@ -12,15 +13,35 @@ import spacy
 from spacy.matcher import PhraseMatcher
 import re
 import requests
+from contextlib import asynccontextmanager
+from ai_data_extractor import OLLAMA_URL
+from extraction_service import ExtractionService
+from fingerprint_store import FingerprintStore
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Streaming Platforms Microservice")
-
 # Caches keyed by site for granularity
 cache = {site: TTLCache(maxsize=1000, ttl=604800) for site in ['justwatch', 'reelgood', 'rottentomatoes']}
 
+# LLM extraction, used when the selector scrapers find nothing
+extraction_service = ExtractionService(
+    ollama_url=os.environ.get("OLLAMA_URL", OLLAMA_URL),
+    concurrency=int(os.environ.get("EXTRACTION_CONCURRENCY", 2)),
+    queue_size=int(os.environ.get("EXTRACTION_QUEUE_SIZE", 100)),
+)
+
+# Detail-page fingerprints, so expired cache entries can be refreshed cheaply
+fingerprints = FingerprintStore()
+
+@asynccontextmanager
+async def lifespan(app):
+    await extraction_service.start()
+    yield
+    await extraction_service.stop()
+
+app = FastAPI(title="Streaming Platforms Microservice", lifespan=lifespan)
+
 # Load spaCy model
 nlp = spacy.load("en_core_web_sm")
 
@@ -72,6 +93,9 @@ class MovieRequest(BaseModel):
     title: str
     year: int
 
+class ExtractRequest(BaseModel):
+    html: str
+
 async def initialize_browser(proxy=None):
     """Initialize Pyppeteer browser with proxy support and enhanced stability."""
     browser_args = [
@@ -97,34 +121,51 @@ async def initialize_browser(proxy=None):
         logger.error(f"Failed to initialize browser: {str(e)}")
         raise
 
-async def scrape_justwatch(title: str, year: int, browser) -> list:
+async def scrape_justwatch(title: str, year: int, browser, detail_pages: dict = None, short_circuit: bool = True, proxy: str = None) -> list:
     """Scraper for JustWatch.com."""
+    fp_key = fingerprints.key("justwatch", title, year)
+    if short_circuit:
+        unchanged = await asyncio.to_thread(fingerprints.check_not_modified, fp_key, proxy)
+        if unchanged is not None:
+            return unchanged
     search_url = f"https://www.justwatch.com/us/search?q={title.replace(' ', '+')}+{year}"
     page = None
     try:
         page = await browser.newPage()
         await page.setViewport({'width': 1920, 'height': 1080})
-        await page.goto(search_url, {'waitUntil': 'networkidle2', 'timeout': 10000})
-        await asyncio.sleep(5)  # Increased for reliability
-        html = await page.content()
-        soup = BeautifulSoup(html, "html.parser")
-        
-        title_link = None
-        for link in soup.find_all("a", href=True):
-            if title.lower() in link.get_text(strip=True).lower() and str(year) in link.get_text(strip=True):
-                title_link = link
-                break
-        if not title_link:
-            logger.warning(f"No title link found on JustWatch for {title} ({year})")
+        # Retries search afresh in case the remembered URL is what went wrong
+        detail_url = fingerprints.detail_url(fp_key) if short_circuit else None
+        if not detail_url:
+            await page.goto(search_url, {'waitUntil': 'networkidle2', 'timeout': 10000})
+            await asyncio.sleep(5)  # Increased for reliability
+            html = await page.content()
+            soup = BeautifulSoup(html, "html.parser")
+            
+            title_link = None
+            for link in soup.find_all("a", href=True):
+                if title.lower() in link.get_text(strip=True).lower() and str(year) in link.get_text(strip=True):
+                    title_link = link
+                    break
+            if not title_link:
+                logger.warning(f"No title link found on JustWatch for {title} ({year})")
+                return []
+            
+            detail_url = f"https://www.justwatch.com{title_link['href']}"
+        response = await page.goto(detail_url, {'waitUntil': 'networkidle2', 'timeout': 10000})
+        if response and not response.ok:
+            logger.warning(f"JustWatch detail page {detail_url} returned {response.status} for {title} ({year})")
+            fingerprints.forget(fp_key)
             return []
-        
-        detail_url = f"https://www.justwatch.com{title_link['href']}"
-        await page.goto(detail_url, {'waitUntil': 'networkidle2', 'timeout': 10000})
         for _ in range(5):
             await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
             await asyncio.sleep(1)
         
         html = await page.content()
+        offer_hash, unchanged = fingerprints.unchanged(fp_key, html, short_circuit)
+        if unchanged is not None:
+            return unchanged
+        if detail_pages is not None:
+            detail_pages["justwatch"] = html
         detail_soup = BeautifulSoup(html, "html.parser")
         platforms = []
         platform_sections = detail_soup.find_all("div", class_=re.compile(r"buybox-row", re.I))
@@ -140,6 +181,7 @@ async def scrape_justwatch(title: str, year: int, browser) -> list:
                     if link and not link.startswith("http"):
                         link = f"https://www.justwatch.com{link}"
                     platforms.append({"platform": platform_name, "link": link})
+        fingerprints.record(fp_key, detail_url, response.headers if response else None, offer_hash, platforms)
         return platforms
     except Exception as e:
         logger.error(f"JustWatch scrape error for {title} ({year}): {str(e)}")
@@ -148,34 +190,51 @@ async def scrape_justwatch(title: str, year: int, browser) -> list:
         if page:
             await page.close()
 
-async def scrape_reelgood(title: str, year: int, browser) -> list:
+async def scrape_reelgood(title: str, year: int, browser, detail_pages: dict = None, short_circuit: bool = True, proxy: str = None) -> list:
     """Scraper for Reelgood.com."""
+    fp_key = fingerprints.key("reelgood", title, year)
+    if short_circuit:
+        unchanged = await asyncio.to_thread(fingerprints.check_not_modified, fp_key, proxy)
+        if unchanged is not None:
+            return unchanged
     search_url = f"https://reelgood.com/search?q={title.replace(' ', '+')}+{year}"
     page = None
     try:
         page = await browser.newPage()
         await page.setViewport({'width': 1920, 'height': 1080})
-        await page.goto(search_url, {'waitUntil': 'networkidle2', 'timeout': 10000})
-        await asyncio.sleep(5)
-        html = await page.content()
-        soup = BeautifulSoup(html, "html.parser")
-        
-        title_link = None
-        for link in soup.find_all("a", href=True):
-            if "/movie/" in link["href"] and title.lower() in link.get_text(strip=True).lower() and str(year) in link.get_text(strip=True):
-                title_link = link
-                break
-        if not title_link:
-            logger.warning(f"No title link found on Reelgood for {title} ({year})")
+        # Retries search afresh in case the remembered URL is what went wrong
+        detail_url = fingerprints.detail_url(fp_key) if short_circuit else None
+        if not detail_url:
+            await page.goto(search_url, {'waitUntil': 'networkidle2', 'timeout': 10000})
+            await asyncio.sleep(5)
+            html = await page.content()
+            soup = BeautifulSoup(html, "html.parser")
+            
+            title_link = None
+            for link in soup.find_all("a", href=True):
+                if "/movie/" in link["href"] and title.lower() in link.get_text(strip=True).lower() and str(year) in link.get_text(strip=True):
+                    title_link = link
+                    break
+            if not title_link:
+                logger.warning(f"No title link found on Reelgood for {title} ({year})")
+                return []
+            
+            detail_url = f"https://reelgood.com{title_link['href']}"
+        response = await page.goto(detail_url, {'waitUntil': 'networkidle2', 'timeout': 10000})
+        if response and not response.ok:
+            logger.warning(f"Reelgood detail page {detail_url} returned {response.status} for {title} ({year})")
+            fingerprints.forget(fp_key)
             return []
-        
-        detail_url = f"https://reelgood.com{title_link['href']}"
-        await page.goto(detail_url, {'waitUntil': 'networkidle2', 'timeout': 10000})
         for _ in range(5):
             await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
             await asyncio.sleep(1)
         
         html = await page.content()
+        offer_hash, unchanged = fingerprints.unchanged(fp_key, html, short_circuit)
+        if unchanged is not None:
+            return unchanged
+        if detail_pages is not None:
+            detail_pages["reelgood"] = html
         detail_soup = BeautifulSoup(html, "html.parser")
         platforms = []
         where_to_watch = detail_soup.find("div", class_=re.compile(r"where-to-watch", re.I))
@@ -188,6 +247,7 @@ async def scrape_reelgood(title: str, year: int, browser) -> list:
                         cleaned = name.strip()
                         if cleaned:
                             platforms.append({"platform": cleaned, "link": None})
+        fingerprints.record(fp_key, detail_url, response.headers if response else None, offer_hash, platforms)
         return platforms
     except Exception as e:
         logger.error(f"Reelgood scrape error for {title} ({year}): {str(e)}")
@@ -196,15 +256,21 @@ async def scrape_reelgood(title: str, year: int, browser) -> list:
         if page:
             await page.close()
 
-async def scrape_rottentomatoes(title: str, year: int, browser) -> list:
+async def scrape_rottentomatoes(title: str, year: int, browser, detail_pages: dict = None, short_circuit: bool = True, proxy: str = None) -> list:
     """Scraper for RottenTomatoes.com."""
+    fp_key = fingerprints.key("rottentomatoes", title, year)
+    if short_circuit:
+        unchanged = await asyncio.to_thread(fingerprints.check_not_modified, fp_key, proxy)
+        if unchanged is not None:
+            return unchanged
     page = None
     try:
+        known_url = fingerprints.detail_url(fp_key) if short_circuit else None
         slug = title.lower().replace(" ", "_")
-        detail_url = f"https://www.rottentomatoes.com/m/{slug}"
+        detail_url = known_url or f"https://www.rottentomatoes.com/m/{slug}"
         page = await browser.newPage()
         await page.setViewport({'width': 1920, 'height': 1080})
-        await page.goto(detail_url, {'waitUntil': 'networkidle2', 'timeout': 10000})
+        response = await page.goto(detail_url, {'waitUntil': 'networkidle2', 'timeout': 10000})
         await asyncio.sleep(5)
         
         html = await page.content()
@@ -219,12 +285,25 @@ async def scrape_rottentomatoes(title: str, year: int, browser) -> list:
                 if "/m/" in link["href"] and title.lower() in link.get_text(strip=True).lower() and str(year) in link.get_text(strip=True):
                     title_link = link
                     break
-            if title_link:
-                detail_url = f"https://www.rottentomatoes.com{title_link['href']}"
-                await page.goto(detail_url, {'waitUntil': 'networkidle2', 'timeout': 10000})
-                await asyncio.sleep(5)
-                html = await page.content()
+            if not title_link:
+                # Don't remember the slug page; it is for a different year or a different film
+                logger.warning(f"No title link found on Rotten Tomatoes for {title} ({year})")
+                fingerprints.forget(fp_key)
+                return []
+            detail_url = f"https://www.rottentomatoes.com{title_link['href']}"
+            response = await page.goto(detail_url, {'waitUntil': 'networkidle2', 'timeout': 10000})
+            await asyncio.sleep(5)
+            html = await page.content()
         
+        if response and not response.ok:
+            logger.warning(f"Rotten Tomatoes detail page {detail_url} returned {response.status} for {title} ({year})")
+            fingerprints.forget(fp_key)
+            return []
+        offer_hash, unchanged = fingerprints.unchanged(fp_key, html, short_circuit)
+        if unchanged is not None:
+            return unchanged
+        if detail_pages is not None:
+            detail_pages["rottentomatoes"] = html
         detail_soup = BeautifulSoup(html, "html.parser")
         platforms = []
         where_to_watch = detail_soup.find("div", class_=re.compile(r"where-to-watch", re.I))
@@ -234,6 +313,7 @@ async def scrape_rottentomatoes(title: str, year: int, browser) -> list:
                 if platform_name:
                     href = link.get("href")
                     platforms.append({"platform": platform_name, "link": href})
+        fingerprints.record(fp_key, detail_url, response.headers if response else None, offer_hash, platforms)
         return platforms
     except Exception as e:
         logger.error(f"Rotten Tomatoes scrape error for {title} ({year}): {str(e)}")
@@ -242,6 +322,53 @@ async def scrape_rottentomatoes(title: str, year: int, browser) -> list:
         if page:
             await page.close()
 
+async def extract_with_llm(title: str, year: int, detail_pages: dict) -> dict:
+    """Fallback: have the LLM read the detail pages when every selector came back empty.
+
+    Returns the platforms found on each site's page, or None for a page the
+    extraction failed on.
+    """
+    # All pages at once, so the service's workers can run them concurrently
+    results = await asyncio.gather(*(extraction_service.extract(html) for html in detail_pages.values()),
+                                   return_exceptions=True)
+    found = {}
+    for site, result in zip(detail_pages, results):
+        if isinstance(result, Exception):
+            logger.error(f"LLM extraction error for {title} ({year}) on {site}: {str(result)}")
+            found[site] = None
+            continue
+        platforms = []
+        for offer in result.get("stream", []):
+            name = str(offer.get("platform") or "").strip()
+            if name:
+                platforms.append({"platform": name, "link": offer.get("url")})
+        if platforms:
+            logger.info(f"LLM fallback found {len(platforms)} platforms for {title} ({year}) on {site}")
+        found[site] = platforms
+    return found
+
+def llm_fallback_platforms(title: str, year: int, sites, answers: dict) -> list:
+    """Merge fresh LLM answers for changed pages with stored ones for the rest.
+
+    Each site's answer is stored under its own fingerprint key, so a page
+    that short-circuited keeps what the LLM found on it last time.
+    """
+    platforms = []
+    seen = set()
+    for site in sites:
+        fp_key = fingerprints.key(site, title, year)
+        site_platforms = answers.get(site)
+        if site_platforms is not None:
+            fingerprints.record_fallback(fp_key, site_platforms)
+        else:
+            # Page unchanged, not fetched, or its extraction failed
+            site_platforms = fingerprints.fallback(fp_key) or []
+        for p in site_platforms:
+            if p["platform"].lower() not in seen:
+                seen.add(p["platform"].lower())
+                platforms.append(p)
+    return platforms
+
 async def fetch_platforms(title: str, year: int) -> list:
     max_retries = 3
     all_platforms = set()
@@ -262,6 +389,7 @@ async def fetch_platforms(title: str, year: int) -> list:
             logger.warning(f"No proxy available for attempt {attempt}, falling back to no proxy")
         
         browser = None
+        detail_pages = {}
         try:
             await asyncio.sleep(random.uniform(2, 5))
             browser = await initialize_browser(proxy)
@@ -273,7 +401,9 @@ async def fetch_platforms(title: str, year: int) -> list:
                     platforms = cache[site][cache_key]
                 else:
                     logger.info(f"Scraping {site} for {title} ({year}), attempt {attempt}")
-                    platforms = await scraper_func(title, year, browser)
+                    # Fingerprints only speed up the first attempt; a retry parses the pages afresh,
+                    # so it neither inflates the refresh stats nor repeats a stale short-circuit
+                    platforms = await scraper_func(title, year, browser, detail_pages, short_circuit=attempt == 1, proxy=proxy)
                     if platforms:
                         cache[site][cache_key] = platforms
                     else:
@@ -291,6 +421,13 @@ async def fetch_platforms(title: str, year: int) -> list:
                             unique_platforms.append(p)
                             break
             
+            if not unique_platforms:
+                # Pages that short-circuited reuse what the LLM found on them last time. If
+                # nothing was stored, the next attempt skips the fingerprints and reparses
+                answers = await extract_with_llm(title, year, detail_pages) if detail_pages else {}
+                unique_platforms = llm_fallback_platforms(title, year, scrapers, answers)
+            
+            logger.info(f"Fingerprint stats: {fingerprints.stats()}")
             if unique_platforms:
                 logger.info(f"Found platforms for {title} ({year}): {unique_platforms}")
                 return unique_platforms
@@ -332,6 +469,20 @@ async def get_streaming_platforms(request: MovieRequest):
         }
     return {"title": request.title, "year": request.year, "platforms": platforms}
 
+@app.post("/extract", response_model=dict)
+async def extract_platforms(request: ExtractRequest):
+    """Run the LLM extractor directly on a detail page's HTML."""
+    try:
+        result = await extraction_service.extract(request.html)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Extraction failed: {str(e)}")
+    return {"stream": result.get("stream", []), "stats": extraction_service.stats}
+
+@app.get("/fingerprint-stats")
+async def fingerprint_stats():
+    """How often detail-page refreshes were short-circuited by fingerprints."""
+    return fingerprints.stats()
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The service modules live next to this folder and are imported as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,18 @@
+from ai_data_extractor import merge_results
+
+
+def test_merge_drops_duplicates_across_chunks():
+    netflix = {"platform": "Netflix", "url": "https://www.netflix.com/title/1"}
+    merged = merge_results([{"stream": [netflix]}, {"stream": [{**netflix, "platform": "NETFLIX"}]}])
+    assert merged == {"stream": [netflix]}
+
+
+def test_merge_tolerates_nulls_and_junk():
+    merged = merge_results([
+        {"stream": None},
+        {"stream": "none found"},
+        None,
+        ["not", "a", "dict"],
+        {"stream": [{"platform": None, "url": None}, "Hulu", {"platform": "Max", "url": ["x"]}]},
+    ])
+    assert [offer["platform"] for offer in merged["stream"]] == [None, "Max"]
@@ -0,0 +1,117 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from chat_backplane import MessageDeduper, UnixSocketBackplane, new_message_id, run_hub
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class Node:
+    """A backplane node that records what it would deliver, deduplicated like chat_server."""
+
+    def __init__(self, path, node_id):
+        self.received = []
+        self.deduper = MessageDeduper()
+        self.backplane = UnixSocketBackplane(path, node_id, reconnect_delay=0.05)
+        self.backplane.start(self.deliver)
+        assert wait_until(lambda: self.backplane._sock is not None)
+
+    def deliver(self, msg_id, payload):
+        if self.deduper.first_time(msg_id):
+            self.received.append(payload)
+
+
+@pytest.fixture
+def hub_path(tmp_path):
+    path = str(tmp_path / "hub.sock")
+    threading.Thread(target=run_hub, args=(path, 64 * 1024), daemon=True).start()
+    assert wait_until(lambda: socket.socket(socket.AF_UNIX).connect_ex(path) == 0)
+    return path
+
+
+@pytest.fixture
+def nodes(hub_path):
+    a, b = Node(hub_path, "a"), Node(hub_path, "b")
+    # The hub accepts asynchronously; wait until it relays between the two
+    assert wait_until(lambda: a.backplane.publish(new_message_id("a"), "ping") or "ping" in b.received)
+    time.sleep(0.1)  # Let pings still in flight land before clearing
+    a.received.clear()
+    b.received.clear()
+    yield a, b
+    a.backplane.close()
+    b.backplane.close()
+
+
+def test_deduper_forgets_oldest_ids():
+    deduper = MessageDeduper(maxsize=2)
+    assert deduper.first_time("1")
+    assert not deduper.first_time("1")
+    deduper.first_time("2")
+    deduper.first_time("3")
+    assert deduper.first_time("1")
+
+
+def test_message_reaches_other_node_but_not_sender(nodes):
+    a, b = nodes
+    a.backplane.publish(new_message_id("a"), "[alice] hi\n")
+    assert wait_until(lambda: b.received == ["[alice] hi\n"])
+    b.backplane.publish(new_message_id("b"), "[bob] hello\n")
+    assert wait_until(lambda: a.received == ["[bob] hello\n"])
+    time.sleep(0.1)
+    assert a.received == ["[bob] hello\n"]
+    assert b.received == ["[alice] hi\n"]
+
+
+def test_repeated_id_is_delivered_once(nodes):
+    a, b = nodes
+    msg_id = new_message_id("a")
+    a.backplane.publish(msg_id, "once\n")
+    a.backplane.publish(msg_id, "once\n")
+    a.backplane.publish(new_message_id("a"), "after\n")
+    assert wait_until(lambda: "after\n" in b.received)
+    assert b.received == ["once\n", "after\n"]
+
+
+def test_receive_thread_survives_malformed_envelopes(hub_path, nodes):
+    a, b = nodes
+    with socket.socket(socket.AF_UNIX) as raw:
+        raw.connect(hub_path)
+        raw.sendall(b'not json\n{"node": "x"}\n[1, 2]\n{"id": "x:1"}\n\xff\xfe\n')
+        time.sleep(0.2)
+    a.backplane.publish(new_message_id("a"), "still here\n")
+    assert wait_until(lambda: b.received == ["still here\n"])
+
+
+def test_receive_thread_survives_failing_delivery(nodes):
+    a, b = nodes
+    b.backplane.on_message = lambda msg_id, payload: 1 / 0
+    a.backplane.publish(new_message_id("a"), "boom\n")
+    time.sleep(0.2)
+    b.backplane.on_message = b.deliver
+    a.backplane.publish(new_message_id("a"), "recovered\n")
+    assert wait_until(lambda: b.received == ["recovered\n"])
+
+
+def test_hub_drops_node_that_stops_reading(hub_path, nodes):
+    a, b = nodes
+    stalled = socket.socket(socket.AF_UNIX)
+    stalled.connect(hub_path)
+    time.sleep(0.1)
+    for i in range(500):
+        a.backplane.publish(new_message_id("a"), f"{i} {'x' * 1000}\n")
+    assert wait_until(lambda: len(b.received) == 500)
+
+    stalled.settimeout(5)
+    while stalled.recv(1 << 20):
+        pass  # Drain what the kernel buffered before the hub hung up
+    stalled.close()
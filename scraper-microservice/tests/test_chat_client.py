@@ -0,0 +1,62 @@
+import pytest
+
+from chat_client import PromptParser
+
+HANDSHAKE = (b"Enter passkey: Enter your username: *** x joined the chat ***\n"
+             b"Connection successful. Welcome to the chat!\n[y] hi\n")
+EXPECTED = [
+    ("passkey", None),
+    ("username", None),
+    ("message", "*** x joined the chat ***"),
+    ("joined", "Connection successful. Welcome to the chat!"),
+    ("message", "[y] hi"),
+]
+
+
+def feed_in_pieces(data, size):
+    parser = PromptParser()
+    events = []
+    for i in range(0, len(data), size):
+        events += parser.feed(data[i:i + size])
+    return parser, events
+
+
+def test_handshake_in_one_read():
+    parser, events = feed_in_pieces(HANDSHAKE, len(HANDSHAKE))
+    assert events == EXPECTED
+    assert parser.state == PromptParser.CHAT
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 15])
+def test_handshake_split_across_reads(size):
+    parser, events = feed_in_pieces(HANDSHAKE, size)
+    assert events == EXPECTED
+    assert parser.state == PromptParser.CHAT
+
+
+def test_space_after_prompt_in_next_read():
+    parser = PromptParser()
+    assert parser.feed(b"Enter your username:") == [("username", None)]
+    assert parser.feed(b" ") == []
+    assert parser.feed(b"*** x joined the chat ***\n") == [("message", "*** x joined the chat ***")]
+
+
+def test_open_room_skips_passkey():
+    parser, events = feed_in_pieces(b"Enter your username: Connection successful. Welcome!\n", 4)
+    assert events == [("username", None), ("joined", "Connection successful. Welcome!")]
+
+
+def test_rejected_passkey():
+    parser, events = feed_in_pieces(b"Enter passkey: Invalid passkey. Connection closed.\n", 5)
+    assert events == [("passkey", None), ("rejected", "Invalid passkey. Connection closed.")]
+    assert parser.state == PromptParser.REJECTED
+    assert parser.feed(b"anything else\n") == []
+
+
+def test_many_lines_in_one_read():
+    parser = PromptParser()
+    parser.feed(b"Enter your username: Connection successful.\n")
+    lines = [f"[u{i}] message {i}" for i in range(1000)]
+    events = parser.feed(("\n".join(lines) + "\n[partial").encode())
+    assert events == [("message", line) for line in lines]
+    assert parser.feed(b" line]\r\n") == [("message", "[partial line]")]
@@ -0,0 +1,116 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+import requests
+
+import mock_ollama
+from extraction_service import ExtractionService, IncrementalJSONParser
+
+PAGE = """<html><body>
+<div class="buybox-row"><a href="https://www.netflix.com/title/1">Netflix</a> Subscription</div>
+<div class="buybox-row"><a href="https://tv.apple.com/movie/2">Apple TV</a> Rent $3.99</div>
+</body></html>"""
+
+
+def feed_all(tokens):
+    parser = IncrementalJSONParser()
+    for token in tokens:
+        parsed = parser.feed(token)
+        if parsed is not None:
+            return parsed
+    return parser.result()
+
+
+def test_parser_ignores_braces_inside_strings():
+    text = '{"stream": [{"platform": "Odd {name} \\"}\\"", "url": "x"}]}'
+    assert feed_all(text[i:i + 3] for i in range(0, len(text), 3)) == {
+        "stream": [{"platform": 'Odd {name} "}"', "url": "x"}]}
+
+
+def test_parser_skips_prose_before_the_json():
+    assert feed_all(["Sure! Here is the data: ", '{"stream"', ": []}"]) == {"stream": []}
+
+
+def test_parser_returns_before_trailing_chatter():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"stream": []}\n\nLet me know') == {"stream": []}
+
+
+@pytest.fixture
+def ollama_url():
+    server = mock_ollama.serve(port=0, delay=0.005)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    mock_ollama.MockOllamaHandler.calls = 0
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+    server.shutdown()
+    server.server_close()
+
+
+async def run_with_service(service, coro_fn):
+    await service.start()
+    try:
+        return await coro_fn()
+    finally:
+        await service.stop()
+
+
+def test_cache_hit_and_miss(ollama_url):
+    service = ExtractionService(ollama_url=ollama_url)
+
+    async def twice():
+        return await service.extract(PAGE), await service.extract(PAGE)
+
+    first, second = asyncio.run(run_with_service(service, twice))
+    assert first == second
+    assert {o["url"] for o in first["stream"]} == {"https://www.netflix.com/title/1", "https://tv.apple.com/movie/2"}
+    assert service.stats["misses"] == 1
+    assert service.stats["hits"] == 1
+    assert mock_ollama.MockOllamaHandler.calls == 1
+
+
+def test_concurrent_calls_share_one_model_call(ollama_url):
+    service = ExtractionService(ollama_url=ollama_url)
+
+    async def three():
+        return await asyncio.gather(*(service.extract(PAGE) for _ in range(3)))
+
+    results = asyncio.run(run_with_service(service, three))
+    assert results[0] == results[1] == results[2]
+    assert service.stats["misses"] == 1
+    assert mock_ollama.MockOllamaHandler.calls == 1
+
+
+def test_raises_when_every_chunk_fails():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        dead_port = sock.getsockname()[1]
+    service = ExtractionService(ollama_url=f"http://127.0.0.1:{dead_port}/api/generate", request_timeout=2)
+
+    with pytest.raises(requests.RequestException):
+        asyncio.run(run_with_service(service, lambda: service.extract(PAGE)))
+    assert service.stats["errors"] == 1
+    assert not service.cache
+
+
+def test_cancelled_caller_does_not_fail_joined_callers(ollama_url):
+    service = ExtractionService(ollama_url=ollama_url)
+
+    async def cancel_first():
+        first = asyncio.create_task(service.extract(PAGE))
+        while not service._in_flight:
+            await asyncio.sleep(0.001)
+        joined = asyncio.create_task(service.extract(PAGE))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        result = await joined
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return result
+
+    result = asyncio.run(run_with_service(service, cancel_first))
+    assert len(result["stream"]) == 2
+    assert service.stats["joined_in_flight"] == 1
+    assert len(service.cache) == 1
+    assert mock_ollama.MockOllamaHandler.calls == 1
@@ -0,0 +1,120 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from fingerprint_store import ANCHOR_RE, NO_OFFERS_HASH, FingerprintStore, offer_hash
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "detail_page.html")
+
+NO_LINKS = """<html><body><h1>Heat</h1>
+<div class="offer-row"><span>Rent</span> <b>$3.99</b></div>
+<div class="offer-row"><span>Buy</span> <b>$9.99</b></div>
+<script>var nonce = "abc";</script></body></html>"""
+
+
+@pytest.fixture(scope="module")
+def page():
+    with open(FIXTURE, encoding="utf-8") as file:
+        return file.read()
+
+
+def test_hash_is_stable_on_fixture(page):
+    assert offer_hash(page) == offer_hash(page)
+    # Markup, scripts and whitespace outside the offers don't matter
+    edited = page.replace("<head>", "<head><script>window.build = 42;</script>", 1).replace("</body>", "\n\n </body>")
+    assert offer_hash(edited) == offer_hash(page)
+    # Nor does the click-tracking wrapper around provider links
+    assert offer_hash(page.replace("uct_web_app_version=3.9.3", "uct_web_app_version=3.9.4")) == offer_hash(page)
+
+
+def test_price_or_offer_edit_changes_hash(page):
+    assert offer_hash(page.replace("$3.99", "$4.99")) != offer_hash(page)
+    assert offer_hash(page.replace("https%3A%2F%2Fwww.netflix.com%2Ftitle%2F80144309", "https%3A%2F%2Fwww.hulu.com%2Fmovie%2F1")) != offer_hash(page)
+
+
+def test_pages_without_provider_links_hash_offer_blocks():
+    assert offer_hash(NO_LINKS) != NO_OFFERS_HASH
+    assert offer_hash(NO_LINKS.replace('"abc"', '"xyz"')) == offer_hash(NO_LINKS)
+    assert offer_hash(NO_LINKS.replace("$9.99", "$7.99")) != offer_hash(NO_LINKS)
+
+
+def test_fixture_without_provider_links_uses_offer_blocks(page):
+    stripped = ANCHOR_RE.sub("", page)
+    assert offer_hash(stripped) not in (NO_OFFERS_HASH, offer_hash(page))
+    assert offer_hash("<html><body><p>Page not found</p></body></html>") == NO_OFFERS_HASH
+
+
+def test_unchanged_record_and_stats(page):
+    store = FingerprintStore()
+    key = store.key("justwatch", "Power Rangers", 2017)
+    platforms = [{"platform": "Netflix", "link": "https://www.netflix.com/title/80144309"}]
+
+    digest, cached = store.unchanged(key, page)
+    assert cached is None
+    store.record(key, "https://www.justwatch.com/us/movie/power-rangers", {"etag": '"v1"'}, digest, platforms)
+    assert store.detail_url(key) == "https://www.justwatch.com/us/movie/power-rangers"
+
+    assert store.unchanged(key, page) == (digest, platforms)
+    assert store.unchanged(key, page, compare=False) == (digest, None)
+    assert store.unchanged(key, page.replace("$3.99", "$4.99"))[1] is None
+
+    stats = store.stats()
+    assert (stats["first_seen"], stats["hash_unchanged"], stats["reparsed"]) == (1, 1, 1)
+    assert stats["fingerprints"] == 1
+
+
+def test_page_without_offers_is_forgotten():
+    store = FingerprintStore()
+    key = store.key("reelgood", "Heat", 1995)
+    store.record(key, "https://reelgood.com/movie/heat-1995", None, offer_hash(NO_LINKS), [])
+    store.record_fallback(key, [{"platform": "Max", "link": None}])
+    store.record(key, "https://reelgood.com/movie/heat-1995", None, NO_OFFERS_HASH, [])
+    assert store.detail_url(key) is None
+    assert store.fallback(key) is None
+
+
+def test_fallbacks_are_per_site():
+    store = FingerprintStore()
+    justwatch, reelgood = store.key("justwatch", "Heat", 1995), store.key("reelgood", "Heat", 1995)
+    store.record_fallback(justwatch, [{"platform": "Netflix", "link": None}])
+    store.record_fallback(reelgood, [{"platform": "Max", "link": None}])
+    store.record_fallback(reelgood, [])  # Reelgood changed and now shows nothing
+
+    assert store.fallback(reelgood) is None
+    assert store.fallback(justwatch) == [{"platform": "Netflix", "link": None}]
+    assert store.stats()["fallback_reused"] == 1
+
+
+class FakeProxy(BaseHTTPRequestHandler):
+    """Answers like a forward proxy sitting in front of a site that hasn't changed."""
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append((self.path, self.headers.get("If-None-Match")))
+        self.send_response(304 if self.headers.get("If-None-Match") == '"v1"' else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_conditional_get_goes_through_proxy():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeProxy)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    proxy = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        store = FingerprintStore()
+        key = store.key("justwatch", "Heat", 1995)
+        platforms = [{"platform": "Netflix", "link": None}]
+        store.record(key, "http://justwatch.invalid/us/movie/heat", {"etag": '"v1"'}, "digest", platforms)
+
+        assert store.check_not_modified(key, proxy) == platforms
+        assert FakeProxy.requests == [("http://justwatch.invalid/us/movie/heat", '"v1"')]
+        stats = store.stats()
+        assert (stats["refreshes"], stats["not_modified"], stats["short_circuit_rate"]) == (1, 1, 1.0)
+    finally:
+        server.shutdown()
+        server.server_close()
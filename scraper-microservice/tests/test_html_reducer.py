@@ -0,0 +1,62 @@
+import os
+import re
+
+import pytest
+
+from html_reducer import (CHARS_PER_TOKEN, OFFER_TEXT_RE, chunk_regions, estimate_tokens, is_provider_url,
+                          reduce_html, unwrap_redirect)
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "detail_page.html")
+
+
+@pytest.fixture(scope="module")
+def page():
+    with open(FIXTURE, encoding="utf-8") as file:
+        return file.read()
+
+
+@pytest.fixture(scope="module")
+def regions(page):
+    return reduce_html(page)
+
+
+def test_fixture_reduces_to_known_regions(page, regions):
+    assert len(regions) == 17
+    assert sum(len(r) for r in regions) < len(page) // 100
+
+
+def test_provider_links_survive(regions):
+    hosts = {re.match(r"https?://([^/]+)", href).group(1)
+             for href in re.findall(r'href="([^"]+)"', "\n".join(regions)) if href.startswith("http")}
+    assert {"www.netflix.com", "tv.apple.com", "www.amazon.com", "athome.fandango.com"} <= hosts
+    assert all(is_provider_url(f"https://{host}/") for host in hosts)
+
+
+def test_scripts_styles_and_svg_are_gone(regions):
+    text = "\n".join(regions)
+    for marker in ("<script", "<style", "<svg", "<path", "--fa-font", "currentColor", "class="):
+        assert marker not in text
+
+
+@pytest.mark.parametrize("max_tokens", [50, 200, 1500])
+def test_no_chunk_exceeds_budget(regions, max_tokens):
+    chunks = chunk_regions(regions, max_tokens)
+    assert chunks
+    assert all(estimate_tokens(chunk) <= max_tokens for chunk in chunks)
+    assert "".join(chunks).replace("\n", "") == "".join(regions).replace("\n", "")
+
+
+def test_oversized_region_is_split():
+    chunks = chunk_regions(["x" * (10 * CHARS_PER_TOKEN + 3), "tail"], max_tokens=10)
+    assert [len(c) for c in chunks] == [40, 3 + 1 + 4]
+
+
+def test_offer_keywords_match_whole_words():
+    assert OFFER_TEXT_RE.search("Rent $3.99")
+    assert OFFER_TEXT_RE.search("Now streaming")
+    assert not OFFER_TEXT_RE.search("Current events")
+    assert not OFFER_TEXT_RE.search("Buyer's guide")
+
+
+def test_tracking_redirect_is_unwrapped():
+    assert unwrap_redirect("https://e.justwatch.com/x?r=https%3A%2F%2Fwww.netflix.com%2Ftitle%2F1") == "https://www.netflix.com/title/1"